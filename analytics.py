@@ -0,0 +1,59 @@
+from datetime import date
+import streamlit as st
+from cache import TTLCache, make_key
+from database import SpendingAnalyzer
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+class AnalyticsService:
+    """Shared spending-pattern service for Smart Analytics and NeuroBot.
+
+    Patterns are computed from an already-loaded expense frame and cached per
+    (user, data version), so chat reruns and page switches reuse the result.
+    """
+
+    def __init__(self, analyzer=None, cache=None):
+        self.analyzer = analyzer or SpendingAnalyzer(None)
+        self.cache = cache if cache is not None else TTLCache(maxsize=1024, ttl=6 * 60 * 60)
+
+    def get_patterns(self, user, df_exp, data_version):
+        """Spending patterns for a typed expense frame (see frames.expense_frame)"""
+        # Trends are over completed days, so results also turn over daily
+        key = make_key("patterns", user, data_version, date.today())
+        patterns = self.cache.get(key)
+        if patterns is None:
+            patterns = self.analyzer.analyze(df_exp, user, data_version)
+            self.cache.set(key, patterns)
+        return patterns
+
+    def get_coach_context(self, user, df_exp, data_version):
+        """Condensed pattern data used in the NeuroBot prompt, or None without expenses"""
+        if df_exp is None or df_exp.empty:
+            return None
+        patterns = self.get_patterns(user, df_exp, data_version)
+        peak = patterns.get('peak_spending_day')
+        return {
+            'peak_day': DAY_NAMES[peak] if isinstance(peak, int) else 'weekdays',
+            'trend': patterns.get('spending_trend', 1),
+            'top_category': patterns.get('top_category', 'miscellaneous')
+        }
+
+    def score_expense(self, user, df_exp, data_version, category, amount):
+        """(score, severity) of a new expense against the category's robust statistics"""
+        self.analyzer.anomalies.unusual_expenses(user, df_exp, data_version)
+        return self.analyzer.anomalies.score(user, category, amount)
+
+    def get_model_outliers(self, user, df_exp, data_version):
+        """(outliers, fresh) from the per-user IsolationForest; never trains on the caller's thread"""
+        return self.analyzer.detect_outliers(df_exp, user, data_version)
+
+    def get_trends(self, user, df_exp, data_version):
+        """DailyTrends (daily spend, rolling 7/30/90-day means) for charts, or None"""
+        return self.analyzer.trends.update(user, df_exp, data_version)
+
+    def invalidate(self):
+        self.cache.clear()
+
+@st.cache_resource
+def get_analytics_service():
+    return AnalyticsService()
@@ -0,0 +1,257 @@
+import math
+import threading
+import numpy as np
+import pandas as pd
+from cache import TTLCache
+from categories import normalize_category
+from frames import rupees
+
+# Relative error of sketch quantiles; 2% keeps a category to a few hundred buckets
+SKETCH_ACCURACY = 0.02
+MIN_AMOUNT = 0.01
+# Modified z-score cut-offs (Iglewicz & Hoaglin recommend flagging above 3.5)
+MEDIUM_SCORE = 3.5
+HIGH_SCORE = 6.0
+MIN_SAMPLES = 5
+# MAD and mean absolute deviation scaled to match a normal standard deviation
+MAD_SCALE = 0.6745
+MEAN_AD_SCALE = 0.7979
+
+class QuantileSketch:
+    """Mergeable quantile sketch for positive amounts (DDSketch-style log buckets).
+
+    Quantiles are within ``accuracy`` relative error. add/remove are O(1);
+    merge is O(buckets). Unlike t-digest or KLL, counts can be removed
+    exactly, which deleted expenses need.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts = {}
+        self.count = 0
+
+    def bucket(self, value):
+        return math.ceil(math.log(max(value, MIN_AMOUNT)) / self._log_gamma)
+
+    def buckets(self, values):
+        """Vectorized ``bucket`` for an array of amounts"""
+        return np.ceil(np.log(np.maximum(values, MIN_AMOUNT)) / self._log_gamma).astype(np.int64)
+
+    def value(self, bucket):
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def add(self, value, n=1):
+        b = self.bucket(value)
+        self.counts[b] = self.counts.get(b, 0) + n
+        self.count += n
+
+    def remove(self, value, n=1):
+        b = self.bucket(value)
+        left = self.counts.get(b, 0) - n
+        if left > 0:
+            self.counts[b] = left
+        else:
+            self.counts.pop(b, None)
+        self.count = max(self.count - n, 0)
+
+    def merge(self, other):
+        for b, n in other.counts.items():
+            self.counts[b] = self.counts.get(b, 0) + n
+        self.count += other.count
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        return _weighted_quantile([(self.value(b), n) for b, n in sorted(self.counts.items())], q, self.count)
+
+    def robust_stats(self):
+        """(median, MAD, mean absolute deviation) from the bucket representatives"""
+        median = self.quantile(0.5)
+        deviations = sorted((abs(self.value(b) - median), n) for b, n in self.counts.items())
+        mad = _weighted_quantile(deviations, 0.5, self.count) if self.count else 0.0
+        mean_ad = sum(d * n for d, n in deviations) / self.count if self.count else 0.0
+        return median, mad, mean_ad
+
+def _weighted_quantile(pairs, q, total):
+    rank = q * (total - 1)
+    seen = 0
+    for value, n in pairs:
+        seen += n
+        if seen > rank:
+            return value
+    return pairs[-1][0]
+
+def robust_score(amount, median, mad, mean_ad):
+    """Modified z-score; falls back to the mean absolute deviation when MAD is 0"""
+    if mad > 0:
+        return MAD_SCALE * (amount - median) / mad
+    if mean_ad > 0:
+        return MEAN_AD_SCALE * (amount - median) / mean_ad
+    return 0.0 if math.isclose(amount, median, rel_tol=SKETCH_ACCURACY) else math.copysign(math.inf, amount - median)
+
+def severity(score):
+    if abs(score) > HIGH_SCORE:
+        return 'high'
+    if abs(score) > MEDIUM_SCORE:
+        return 'medium'
+    return None
+
+class CategoryStats:
+    """A category's sketch plus its robust statistics, recomputed only after changes"""
+
+    def __init__(self, name):
+        self.name = name
+        self.sketch = QuantileSketch()
+        self._stats = None
+
+    def add(self, amount, n=1):
+        self.sketch.add(amount, n)
+        self._stats = None
+
+    def remove(self, amount):
+        self.sketch.remove(amount)
+        self._stats = None
+
+    def score(self, amount):
+        """Score ``amount`` against the category so far; None until there are enough samples"""
+        if self.sketch.count < MIN_SAMPLES:
+            return None
+        if self._stats is None:
+            self._stats = self.sketch.robust_stats()
+        return robust_score(amount, *self._stats)
+
+class UserAnomalies:
+    def __init__(self, version):
+        self.version = version
+        self.categories = {}
+        self.rows = {}
+        self.flagged = {}
+        self.lock = threading.Lock()
+
+    def stats(self, name):
+        key = normalize_category(name)
+        if key not in self.categories:
+            self.categories[key] = CategoryStats(name)
+        return self.categories[key]
+
+class AnomalyMonitor:
+    """Streaming per-category anomaly detection on robust statistics.
+
+    Each user's state is built once from the expense frame (vectorized), then
+    kept current from change-feed events: an insert is scored against its
+    category's median/MAD before being added to the sketch, and a delete is
+    removed from it, so the flagged list never needs a rescan. A version the
+    events did not cover (e.g. a category merge) triggers a rebuild.
+    """
+
+    def __init__(self, label=None):
+        self.label = label or (lambda user, category_id, text: text)
+        self._states = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+
+    def unusual_expenses(self, user, df_exp, data_version=None):
+        """Flagged expenses, newest first, in the analyzer's ``unusual_expenses`` format"""
+        state = self._states.get(user) if user is not None and data_version is not None else None
+        if state is None or state.version != data_version:
+            state = self._build(df_exp, data_version)
+            if user is not None and data_version is not None:
+                self._states.set(user, state)
+        with state.lock:
+            flagged = list(state.flagged.values())
+        return sorted(flagged, key=lambda a: a['date'], reverse=True)
+
+    def score(self, user, category, amount):
+        """(score, severity) for a prospective expense, or (None, None) without enough history"""
+        state = self._states.get(user)
+        if state is None:
+            return None, None
+        with state.lock:
+            stats = state.categories.get(normalize_category(category))
+            score = stats.score(float(amount)) if stats is not None else None
+        return (score, severity(score)) if score is not None else (None, None)
+
+    def on_changes(self, user, events, version):
+        """ChangeFeed listener: fold inserts and deletes into the user's sketches"""
+        state = self._states.get(user)
+        if state is None:
+            return
+        with state.lock:
+            for event in events:
+                if event.table != "expenses":
+                    continue
+                if event.op == "INSERT":
+                    self._insert(user, state, event.row)
+                elif event.op == "DELETE":
+                    self._delete(state, event.row["id"])
+            state.version = version
+
+    def forget(self, user):
+        self._states.pop(user)
+
+    def _insert(self, user, state, row):
+        if row["id"] in state.rows:
+            return
+        name = self.label(user, row.get("category_id"), row.get("category"))
+        amount = float(row.get("amount") or 0)
+        stats = state.stats(name)
+        score = stats.score(amount)
+        stats.add(amount)
+        state.rows[row["id"]] = (normalize_category(name), amount)
+        level = severity(score) if score is not None else None
+        if level:
+            state.flagged[row["id"]] = {
+                'id': row["id"],
+                'date': str(row.get("date") or "")[:10],
+                'category': stats.name,
+                'amount': amount,
+                'severity': level,
+            }
+
+    def _delete(self, state, row_id):
+        entry = state.rows.pop(row_id, None)
+        if entry is None:
+            return
+        key, amount = entry
+        state.categories[key].remove(amount)
+        state.flagged.pop(row_id, None)
+
+    def _build(self, df_exp, version):
+        """State for a whole frame; every row is scored against its category's current statistics"""
+        state = UserAnomalies(version)
+        if df_exp is None or df_exp.empty:
+            return state
+        names = df_exp["category"].astype(str)
+        keys = names.map({name: normalize_category(name) for name in names.unique()})
+        amounts = rupees(df_exp["amount"].to_numpy())
+        buckets = QuantileSketch().buckets(amounts)
+        counts = pd.DataFrame({"key": keys, "bucket": buckets, "name": names}).groupby(["key", "bucket"]).agg(
+            name=("name", "first"), n=("name", "size"))
+        for (key, bucket), row in counts.iterrows():
+            if key not in state.categories:
+                state.categories[key] = CategoryStats(row["name"])
+            stats = state.categories[key]
+            stats.sketch.counts[bucket] = int(row["n"])
+            stats.sketch.count += int(row["n"])
+
+        # Vectorized scoring: per-category statistics broadcast onto the rows
+        table = pd.DataFrame.from_dict(
+            {key: (stats.sketch.count,) + stats.sketch.robust_stats() for key, stats in state.categories.items()},
+            orient="index", columns=["count", "median", "mad", "mean_ad"]).reindex(keys)
+        count, median, mad, mean_ad = (table[c].to_numpy(dtype=float) for c in table.columns)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(mad > 0, MAD_SCALE * (amounts - median) / mad,
+                              np.where(mean_ad > 0, MEAN_AD_SCALE * (amounts - median) / mean_ad, 0.0))
+        scores[count < MIN_SAMPLES] = 0.0
+        ids = df_exp["id"].to_numpy()
+        keys = keys.to_numpy()
+        state.rows = dict(zip(ids.tolist(), zip(keys.tolist(), amounts.tolist())))
+        dates = df_exp["date"].dt.strftime("%Y-%m-%d").to_numpy()
+        for i in np.flatnonzero(np.abs(scores) > MEDIUM_SCORE):
+            state.flagged[int(ids[i])] = {
+                'id': int(ids[i]),
+                'date': dates[i],
+                'category': state.categories[keys[i]].name,
+                'amount': float(amounts[i]),
+                'severity': severity(scores[i]),
+            }
+        return state
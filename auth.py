@@ -1,11 +1,43 @@
 import streamlit as st
 from supabase import Client
+from concurrent.futures import ThreadPoolExecutor
+from passwords import get_password_hasher
+from ratelimit import get_auth_guard
 import re
 import hashlib
+import hmac
+import base64
+import time
+
+SESSION_TTL_SECONDS = 7 * 24 * 60 * 60
+SESSION_PARAM = "session"
+
+@st.cache_resource
+def get_auth_executor():
+    """Background pool for auth bookkeeping writes (e.g. last_login)"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="auth-bg")
 
 class AuthManager:
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
+        self.hasher = get_password_hasher()
+        self.guard = get_auth_guard()
+        # Remembered sessions need their own secret; without one the fast path stays off
+        self._session_secret = str(st.secrets.get("session_secret") or "").encode()
+    
+    def _client_id(self):
+        """Client key for rate limiting: the peer IP, else the hop our proxy appended to X-Forwarded-For.
+        
+        Earlier X-Forwarded-For entries are whatever the client sent, so they are never used.
+        """
+        try:
+            ip = getattr(st.context, "ip_address", None)
+            if ip:
+                return ip
+            forwarded = st.context.headers.get("X-Forwarded-For", "")
+            return forwarded.split(",")[-1].strip() or None
+        except Exception:
+            return None
     
     def is_valid_email(self, email):
         """Validate email format"""
@@ -39,19 +71,28 @@ class AuthManager:
             if not is_valid:
                 return False, message
             
+            normalized = email.lower().strip()
+            throttled = self.guard.check(normalized, self._client_id())
+            if throttled:
+                return False, throttled
+            
             # Check if user already exists
-            existing_user = self.supabase.table("auth_users").select("email").eq("email", email.lower().strip()).execute()
+            if self.guard.is_known(normalized):
+                return False, "An account with this email already exists"
+            existing_user = self.supabase.table("auth_users").select("email").eq("email", normalized).execute()
             if existing_user.data:
+                self.guard.mark_known(normalized)
                 return False, "An account with this email already exists"
             
             # Create user in our custom auth table
             user_data = {
-                "email": email.lower().strip(),
+                "email": normalized,
                 "password_hash": self._hash_password(password),
                 "is_verified": False
             }
             
             result = self.supabase.table("auth_users").insert(user_data).execute()
+            self.guard.mark_known(normalized)
             
             return True, "Account created successfully! Please login with your credentials."
             
@@ -67,34 +108,107 @@ class AuthManager:
             if not self.is_valid_email(email):
                 return False, "Please enter a valid email address"
             
-            # Get user from database
-            user_result = self.supabase.table("auth_users").select("*").eq("email", email.lower().strip()).execute()
+            normalized = email.lower().strip()
+            throttled = self.guard.check(normalized, self._client_id())
+            if throttled:
+                return False, throttled
+            
+            # Recently looked-up emails with no account are rejected without a query
+            if self.guard.is_unknown(normalized):
+                return False, "Invalid email or password"
+            
+            # Get user from database (the only query on the login path)
+            user_result = self.supabase.table("auth_users").select("password_hash").eq("email", normalized).execute()
             
             if not user_result.data:
+                self.guard.mark_unknown(normalized)
                 return False, "Invalid email or password"
             
             user = user_result.data[0]
             
             # Verify password
-            if not self._verify_password(password, user["password_hash"]):
+            ok, needs_rehash = self.hasher.verify(password, user["password_hash"])
+            if not ok:
                 return False, "Invalid email or password"
             
-            # Update last login
-            self.supabase.table("auth_users").update({"last_login": "now()"}).eq("email", email.lower().strip()).execute()
+            # Update last login (and upgrade legacy hashes) off the request path
+            self.guard.mark_known(normalized)
+            self._touch_last_login(normalized, password if needs_rehash else None)
             
             return True, "Login successful!"
             
         except Exception as e:
             return False, f"Login failed: {str(e)}"
     
+    def _touch_last_login(self, email, rehash_password=None):
+        def update():
+            try:
+                changes = {"last_login": "now()"}
+                if rehash_password is not None:
+                    changes["password_hash"] = self._hash_password(rehash_password)
+                self.supabase.table("auth_users").update(changes).eq("email", email).execute()
+            except Exception:
+                pass  # Bookkeeping only; never fail a login over it
+        get_auth_executor().submit(update)
+    
+    def _token_version(self, email):
+        """The user's current session token version (None if there is no such user)"""
+        result = self.supabase.table("auth_users").select("token_version").eq("email", email).execute()
+        return int(result.data[0].get("token_version") or 0) if result.data else None
+    
+    def create_session_token(self, email):
+        """Signed token that lets a returning browser session skip re-authentication.
+        
+        The token carries the user's token version, so logging out or changing
+        the password revokes every token issued before. None when no
+        ``session_secret`` is configured.
+        """
+        if not self._session_secret:
+            return None
+        try:
+            email = email.lower().strip()
+            version = self._token_version(email)
+            if version is None:
+                return None
+            expires = int(time.time()) + SESSION_TTL_SECONDS
+            payload = f"{email}|{expires}|{version}"
+            signature = hmac.new(self._session_secret, payload.encode(), hashlib.sha256).hexdigest()
+            return base64.urlsafe_b64encode(f"{payload}|{signature}".encode()).decode()
+        except Exception:
+            return None
+    
+    def verify_session_token(self, token):
+        """Return the email for a valid, unexpired, unrevoked token, else None"""
+        if not token or not self._session_secret:
+            return None
+        try:
+            email, expires, version, signature = base64.urlsafe_b64decode(token.encode()).decode().rsplit("|", 3)
+            expected = hmac.new(self._session_secret, f"{email}|{expires}|{version}".encode(), hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(signature, expected) or int(expires) < time.time():
+                return None
+            if self._token_version(email) != int(version):
+                return None
+        except Exception:
+            return None
+        return email
+    
+    def revoke_sessions(self, email):
+        """Invalidate every remembered session token issued for the user"""
+        try:
+            email = email.lower().strip()
+            version = self._token_version(email)
+            if version is not None:
+                self.supabase.table("auth_users").update({"token_version": version + 1}).eq("email", email).execute()
+        except Exception as e:
+            st.error(f"Error ending remembered sessions: {str(e)}")
+    
     def _hash_password(self, password):
-        """Simple password hashing (use proper hashing in production)"""
-        salt = "neurobux_salt_2025"  # In production, use random salt per user
-        return hashlib.sha256((password + salt).encode()).hexdigest()
+        """bcrypt hash with the configured cost"""
+        return self.hasher.hash(password)
     
     def _verify_password(self, password, password_hash):
-        """Verify password against hash"""
-        return self._hash_password(password) == password_hash
+        """Verify password against a bcrypt or legacy SHA-256 hash"""
+        return self.hasher.verify(password, password_hash)[0]
     
     def change_password(self, email, old_password, new_password):
         """Change user password"""
@@ -115,9 +229,11 @@ class AuthManager:
             if not is_valid:
                 return False, message
             
-            # Update password
+            # Update password; the version bump revokes remembered sessions
             new_hash = self._hash_password(new_password)
-            self.supabase.table("auth_users").update({"password_hash": new_hash}).eq("email", email.lower().strip()).execute()
+            changes = {"password_hash": new_hash, "token_version": int(user.get("token_version") or 0) + 1}
+            self.supabase.table("auth_users").update(changes).eq("email", email.lower().strip()).execute()
+            self.invalidate_user_info(email)
             
             return True, "Password changed successfully!"
             
@@ -125,14 +241,22 @@ class AuthManager:
             return False, f"Password change failed: {str(e)}"
     
     def get_user_info(self, email):
-        """Get user information - THIS WAS THE MISSING METHOD"""
+        """Get user information (cached for the browser session)"""
+        cache = st.session_state.setdefault("user_info_cache", {})
+        key = email.lower().strip()
+        if key in cache:
+            return cache[key]
         try:
-            user_result = self.supabase.table("auth_users").select("email, created_at, last_login, is_verified").eq("email", email.lower().strip()).execute()
+            user_result = self.supabase.table("auth_users").select("email, created_at, last_login, is_verified").eq("email", key).execute()
             
-            if user_result.data:
-                return user_result.data[0]
-            return None
+            info = user_result.data[0] if user_result.data else None
+            if info is not None:
+                cache[key] = info
+            return info
             
         except Exception as e:
             st.error(f"Error fetching user info: {str(e)}")
             return None
+    
+    def invalidate_user_info(self, email):
+        st.session_state.get("user_info_cache", {}).pop(email.lower().strip(), None)
@@ -0,0 +1,98 @@
+import os
+import stat
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+# Models and indexes persisted between restarts; never a shared temp dir, since they are unpickled
+DATA_DIR = os.environ.get("NEUROBUX_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".neurobux")
+
+
+def make_key(*parts):
+    """Stable SHA-256 hex digest of the given parts (used as cache keys)"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def private_dir(name):
+    """Directory ``name`` under DATA_DIR, created with owner-only permissions.
+
+    Raises PermissionError if it exists but belongs to another user.
+    """
+    path = os.path.join(DATA_DIR, name)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"{path} is not owned by this user")
+    os.chmod(path, 0o700)
+    return path
+
+
+def owned_file(path):
+    """Whether ``path`` is a regular file owned by this process's user (safe to unpickle)"""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISREG(info.st_mode) and info.st_uid == os.getuid()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry.
+
+    Entries older than ``ttl`` seconds are treated as missing, and the least
+    recently used entry is evicted once ``maxsize`` is exceeded. ``clock`` can
+    be swapped for a fake in local checks.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self.clock() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
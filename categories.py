@@ -0,0 +1,156 @@
+import itertools
+import re
+import threading
+import unicodedata
+from cache import TTLCache
+
+# The id<->name map is tiny; refresh it now and then to pick up other processes' additions
+MAP_TTL_SECONDS = 10 * 60
+_SERIALS = itertools.count(1)
+
+def normalize_category(name):
+    """Grouping key for a category name: "Food", "food " and "FOOD" share one key"""
+    text = unicodedata.normalize("NFKC", str(name or ""))
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+def display_category(name):
+    """Name as first typed, with whitespace collapsed; all-lowercase input is title-cased"""
+    text = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", str(name or ""))).strip()
+    return text.title() if text.islower() else text
+
+class CategoryMap:
+    """One user's categories: ``names`` maps id -> display name, ``ids`` maps key -> canonical id"""
+
+    def __init__(self, rows=()):
+        self.serial = next(_SERIALS)  # Identifies this load; merges and refreshes build a new map
+        self.names = {}
+        self.ids = {}
+        aliases = []
+        for row in rows:
+            if row.get("alias_of"):
+                aliases.append(row)
+            else:
+                self.add(row["id"], row["key"], row["name"])
+        for row in aliases:
+            target = row["alias_of"]
+            self.ids[row["key"]] = target
+            self.names[row["id"]] = self.names.get(target, row["name"])
+
+    def add(self, category_id, key, name):
+        self.ids[key] = category_id
+        self.names[category_id] = name
+
+
+class CategoryDictionary:
+    """Per-user category dictionary backed by the ``categories`` table.
+
+    Table columns: id (bigint identity), user_email, name, key (normalized
+    name, unique per user) and alias_of (nullable id of the category an alias
+    was merged into). Expenses store ``category_id``; the id<->name map is
+    cached here per user and updated in place on writes.
+    """
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+        self._maps = TTLCache(maxsize=10000, ttl=MAP_TTL_SECONDS)
+        self._lock = threading.Lock()
+
+    def get_map(self, user, refresh=False):
+        mapping = None if refresh else self._maps.get(user)
+        if mapping is None:
+            result = self.supabase.table("categories").select("id,name,key,alias_of").eq("user_email", user).execute()
+            mapping = CategoryMap(result.data)
+            self._maps.set(user, mapping)
+        return mapping
+
+    def serial(self, user):
+        """Changes whenever the user's map is reloaded (e.g. after a merge)"""
+        try:
+            return self.get_map(user).serial
+        except Exception:
+            return None
+
+    def ensure(self, user, name):
+        """The canonical id for ``name``, creating the category if needed (None on failure)"""
+        key = normalize_category(name)
+        if not key or not self.supabase:
+            return None
+        try:
+            mapping = self.get_map(user)
+            if key in mapping.ids:
+                return mapping.ids[key]
+            with self._lock:
+                mapping = self.get_map(user)
+                if key in mapping.ids:
+                    return mapping.ids[key]
+                try:
+                    row = self.supabase.table("categories").insert(
+                        {"user_email": user, "name": display_category(name), "key": key}
+                    ).execute().data[0]
+                except Exception:
+                    # Another process may have created it first
+                    return self.get_map(user, refresh=True).ids.get(key)
+                mapping.add(row["id"], key, row["name"])
+                return row["id"]
+        except Exception:
+            return None
+
+    def merge(self, user, source, target):
+        """Make category ``source`` an alias of ``target``; returns (source_id, target_id)"""
+        mapping = self.get_map(user, refresh=True)
+        source_id = mapping.ids.get(normalize_category(source))
+        target_id = mapping.ids.get(normalize_category(target))
+        if source_id is None or target_id is None or source_id == target_id:
+            raise ValueError("Pick two different existing categories")
+        table = self.supabase.table("categories")
+        table.update({"alias_of": target_id}).eq("user_email", user).eq("id", source_id).execute()
+        # Earlier aliases of the source now point straight at the target
+        table.update({"alias_of": target_id}).eq("user_email", user).eq("alias_of", source_id).execute()
+        self._maps.pop(user)
+        return source_id, target_id
+
+    def labels(self, user, ids, texts):
+        """Category names for rows given their ``category_id`` and legacy ``category`` text"""
+        import pandas as pd  # deferred: the dictionary itself is imported at startup
+
+        ids = pd.to_numeric(pd.Series(ids), errors="coerce")
+        texts = pd.Series(texts, index=ids.index, dtype=object)
+        try:
+            mapping = self.get_map(user)
+            if not ids.dropna().isin(list(mapping.names)).all():
+                mapping = self.get_map(user, refresh=True)
+        except Exception:
+            mapping = CategoryMap()
+        # Rows written before the dictionary existed resolve through their normalized text
+        legacy = ids.isna() & texts.notna()
+        if legacy.any():
+            ids[legacy] = texts[legacy].map(lambda t: mapping.ids.get(normalize_category(t))).astype(float)
+        labels = ids.map(mapping.names).astype(object)
+        unresolved = labels.isna()
+        if unresolved.any():
+            # Unknown legacy names still group by key, shown as one of their spellings
+            legacy_texts = texts[unresolved].fillna("")
+            keys = legacy_texts.map(normalize_category)
+            shown = dict(zip(keys, legacy_texts.map(display_category)))
+            labels[unresolved] = keys.map(shown)
+        return labels
+
+    def label(self, user, category_id, text=None):
+        """Category name for a single row (see ``labels``)"""
+        try:
+            mapping = self.get_map(user)
+            if category_id is not None and category_id not in mapping.names:
+                mapping = self.get_map(user, refresh=True)
+        except Exception:
+            mapping = CategoryMap()
+        if category_id is not None and category_id in mapping.names:
+            return mapping.names[category_id]
+        category_id = mapping.ids.get(normalize_category(text))
+        return mapping.names[category_id] if category_id is not None else display_category(text)
+
+    def clear(self, user):
+        try:
+            self.supabase.table("categories").delete().eq("user_email", user).execute()
+        except Exception:
+            pass  # Leftover entries are harmless; they are reused if the names come back
+        self._maps.pop(user)
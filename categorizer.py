@@ -0,0 +1,141 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+from cache import TTLCache
+from categories import normalize_category
+
+FALLBACK_CATEGORY = "Other"
+N_FEATURES = 2 ** 18
+# Incremental updates reuse the IDF weights of the last full fit; refit once
+# this share of the examples arrived since then
+REFIT_FRACTION = 0.25
+_NOISE = re.compile(r"[\d_/\\#*:.@-]+")
+# Payment-rail and bank boilerplate that says nothing about the merchant
+_BOILERPLATE = frozenset("upi neft imps rtgs ach nach pos ecom txn trf ref refno payment debit dr card "
+                         "vpa ybl okaxis oksbi okhdfcbank okicici".split())
+
+def clean_description(text):
+    """Statement text -> classifier input: normalized, with reference numbers and boilerplate dropped"""
+    words = _NOISE.sub(" ", normalize_category(text)).split()
+    return " ".join(w for w in words if w not in _BOILERPLATE)
+
+def training_examples(df_exp):
+    """Unique (text, category) pairs with row counts; rows without a description learn from the category name"""
+    names = df_exp["category"].astype(str)
+    if "description" in df_exp:
+        descriptions = df_exp["description"].astype(str)
+        texts = descriptions.where(descriptions.str.strip() != "", names)
+    else:
+        texts = names
+    pairs = pd.DataFrame({"text": texts.map({t: clean_description(t) for t in texts.unique()}), "label": names})
+    # Every category name is also an example of itself, so a new user's names still match merchants
+    pairs = pd.concat([pairs, pd.DataFrame({"text": names.unique(), "label": names.unique()}).assign(
+        text=lambda d: d["text"].map(clean_description))], ignore_index=True)
+    pairs = pairs[pairs["text"] != ""]
+    return pairs.groupby(["text", "label"], observed=True).size().rename("n")
+
+class UserModel:
+    """A user's classifier plus the examples it has been trained on"""
+
+    def __init__(self, version, examples, tfidf=None, model=None, fitted=0):
+        self.version = version
+        self.examples = examples
+        self.tfidf = tfidf
+        self.model = model
+        self.fitted = fitted  # examples at the last full fit
+        self.pending = 0  # examples folded in with partial_fit since then
+
+    @property
+    def labels(self):
+        return sorted(self.examples.index.get_level_values("label").unique())
+
+class AutoCategorizer:
+    """Predicts categories for imported statement lines from the user's own history.
+
+    Descriptions are hashed into character n-grams (no vocabulary to refit),
+    weighted by TF-IDF and classified with a linear SGD model. Models are
+    cached per user and data version; when a new version only adds examples
+    for known categories they are folded in with ``partial_fit``, anything
+    else (deletes, merges, new categories) triggers a full refit. Prediction
+    runs once per distinct cleaned description, so a long statement costs a
+    single vectorized call.
+    """
+
+    def __init__(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.hasher = HashingVectorizer(analyzer="char_wb", ngram_range=(2, 4), n_features=N_FEATURES,
+                                        alternate_sign=False, norm=None)
+        self._models = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+        self._lock = threading.Lock()
+
+    def categorize(self, user, df_exp, data_version, descriptions):
+        """(categories, confidences) arrays aligned with ``descriptions``"""
+        texts = pd.Series(descriptions, dtype=object).fillna("").astype(str)
+        codes, uniques = pd.factorize(texts.map(clean_description))
+        if len(uniques) == 0:
+            return np.full(len(texts), FALLBACK_CATEGORY, dtype=object), np.zeros(len(texts))
+        state = self.model(user, df_exp, data_version)
+        labels = state.labels if state is not None else []
+        if len(labels) < 2:
+            only = labels[0] if labels else FALLBACK_CATEGORY
+            return np.full(len(texts), only, dtype=object), np.full(len(texts), 1.0 if labels else 0.0)
+        X = state.tfidf.transform(self.hasher.transform(uniques))
+        proba = state.model.predict_proba(X)
+        best = proba.argmax(axis=1)
+        return state.model.classes_[best][codes], proba[np.arange(len(best)), best][codes]
+
+    def model(self, user, df_exp, data_version):
+        """The user's UserModel for ``data_version`` (None without history)"""
+        if df_exp is None or df_exp.empty:
+            return None
+        state = self._models.get(user)
+        if state is not None and state.version == data_version:
+            return state
+        with self._lock:
+            state = self._models.get(user)
+            if state is None or state.version != data_version:
+                state = self._update(state, training_examples(df_exp), data_version)
+                self._models.set(user, state)
+        return state
+
+    def _update(self, state, examples, data_version):
+        if state is not None and state.model is not None:
+            old = state.examples.reindex(examples.index, fill_value=0)
+            grown = examples - old
+            known = set(state.model.classes_)
+            only_added = (grown >= 0).all() and len(examples) >= len(state.examples) \
+                and state.examples.index.isin(examples.index).all()
+            if only_added and set(grown[grown > 0].index.get_level_values("label")) <= known \
+                    and state.pending + int(grown.sum()) <= REFIT_FRACTION * max(state.fitted, 1):
+                added = grown[grown > 0]
+                if len(added):
+                    X = state.tfidf.transform(self.hasher.transform(added.index.get_level_values("text")))
+                    state.model.partial_fit(X, added.index.get_level_values("label"), sample_weight=np.log1p(added.to_numpy()))
+                state.version = data_version
+                state.examples = examples
+                state.pending += int(grown.sum())
+                return state
+        return self._fit(examples, data_version)
+
+    def _fit(self, examples, data_version):
+        from sklearn.feature_extraction.text import TfidfTransformer
+        from sklearn.linear_model import SGDClassifier
+
+        state = UserModel(data_version, examples, fitted=int(examples.sum()))
+        if len(state.labels) < 2:
+            return state
+        counts = self.hasher.transform(examples.index.get_level_values("text"))
+        state.tfidf = TfidfTransformer(sublinear_tf=True).fit(counts)
+        # Logistic loss gives calibrated-enough probabilities for confidence and supports partial_fit
+        state.model = SGDClassifier(loss="log_loss", alpha=1e-3, max_iter=20, tol=None, random_state=0)
+        state.model.fit(state.tfidf.transform(counts), examples.index.get_level_values("label"),
+                        sample_weight=np.log1p(examples.to_numpy()))
+        return state
+
+@st.cache_resource
+def get_auto_categorizer():
+    """Process-wide categorizer; models are cached inside it per user"""
+    return AutoCategorizer()
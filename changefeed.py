@@ -0,0 +1,158 @@
+import itertools
+import threading
+from collections import defaultdict
+
+INSERT = "INSERT"
+DELETE = "DELETE"
+# Snapshot revisions are unique across snapshots, so a reloaded snapshot never reuses one
+_REVISIONS = itertools.count(1)
+
+class ChangeEvent:
+    def __init__(self, table, op, row):
+        self.table = table
+        self.op = op
+        self.row = row
+
+class TableSnapshot:
+    """One user's rows of one table, kept current by applying change events.
+
+    ``monthly_totals`` is maintained incrementally so month lists and totals
+    never need a rescan. ``revision`` changes with every applied event, so
+    caches derived from one table can ignore writes to the others.
+    """
+
+    def __init__(self, rows):
+        self.rows = {}
+        self.max_id = 0
+        self.monthly_totals = defaultdict(float)
+        self.monthly_counts = defaultdict(int)
+        self._lock = threading.Lock()
+        for row in rows:
+            self._insert(row)
+        self.revision = next(_REVISIONS)
+
+    def _insert(self, row):
+        if row["id"] in self.rows:
+            return
+        self.rows[row["id"]] = row
+        self.max_id = max(self.max_id, row["id"])
+        month = str(row.get("date") or "")[:7]
+        self.monthly_totals[month] += float(row.get("amount") or 0)
+        self.monthly_counts[month] += 1
+
+    def _delete(self, row_id):
+        row = self.rows.pop(row_id, None)
+        if row is None:
+            return
+        month = str(row.get("date") or "")[:7]
+        self.monthly_totals[month] -= float(row.get("amount") or 0)
+        self.monthly_counts[month] -= 1
+        if self.monthly_counts[month] <= 0:
+            del self.monthly_totals[month]
+            del self.monthly_counts[month]
+
+    def apply(self, event):
+        with self._lock:
+            if event.op == INSERT:
+                self._insert(event.row)
+            elif event.op == DELETE:
+                self._delete(event.row["id"])
+            self.revision = next(_REVISIONS)
+
+    def records(self, year_month=None):
+        """Rows (optionally for one month), newest first"""
+        with self._lock:
+            rows = list(self.rows.values())
+        if year_month:
+            rows = [r for r in rows if str(r.get("date") or "").startswith(year_month)]
+        return sorted(rows, key=lambda r: str(r.get("date") or ""), reverse=True)
+
+    def months(self):
+        with self._lock:
+            return sorted((m for m in self.monthly_totals if m), reverse=True)
+
+class PollingChangeSource:
+    """Derives row-level deltas by polling; a stand-in for Supabase Realtime.
+
+    Inserts are rows with an id above the highest one already seen; deletes
+    are ids that disappeared from a lightweight id-only listing. In-place
+    updates are invisible to it, so writers that update rows (category
+    merges) call ``ChangeFeed.forget`` and the next sync reloads the tables.
+    Polling only happens after the user's data version has moved.
+    """
+
+    def __init__(self, supabase_client):
+        self.supabase = supabase_client
+
+    def load(self, table, user):
+        return self.supabase.table(table).select("*").eq("user_email", user).execute().data
+
+    def changes(self, table, user, snapshot):
+        events = []
+        new_rows = self.supabase.table(table).select("*").eq("user_email", user).gt("id", snapshot.max_id).execute().data
+        events += [ChangeEvent(table, INSERT, row) for row in new_rows]
+        current_ids = {r["id"] for r in self.supabase.table(table).select("id").eq("user_email", user).execute().data}
+        events += [ChangeEvent(table, DELETE, {"id": row_id}) for row_id in set(snapshot.rows) - current_ids]
+        return events
+
+class ChangeFeed:
+    """Keeps per-user table snapshots in step with the database across sessions.
+
+    ``sync`` is cheap when nothing changed (one cached data-version read);
+    otherwise it pulls deltas from the source and applies them in place, then
+    notifies listeners with the events.
+    """
+
+    def __init__(self, versions, source, tables=("expenses", "income")):
+        self.versions = versions
+        self.source = source
+        self.tables = tables
+        self.listeners = []
+        self._snapshots = {}
+        self._synced_version = {}
+        self._locks = defaultdict(threading.Lock)
+
+    def subscribe(self, callback):
+        """``callback(user, events, version)`` is called after deltas up to ``version`` are applied"""
+        self.listeners.append(callback)
+
+    def sync(self, user):
+        version = self.versions.get(user)
+        if self._synced_version.get(user) == version:
+            return
+        with self._locks[user]:
+            version = self.versions.get(user)
+            if self._synced_version.get(user) == version:
+                return
+            snapshots = self._snapshots.get(user)
+            events = []
+            try:
+                if snapshots is None:
+                    snapshots = {table: TableSnapshot(self.source.load(table, user)) for table in self.tables}
+                    self._snapshots[user] = snapshots
+                else:
+                    for table in self.tables:
+                        table_events = self.source.changes(table, user, snapshots[table])
+                        for event in table_events:
+                            snapshots[table].apply(event)
+                        events += table_events
+            except Exception:
+                # Leave the user unsynced; managers fall back to direct queries
+                return
+            self._synced_version[user] = version
+        if events:
+            for callback in self.listeners:
+                callback(user, events, version)
+
+    def current(self, user, table):
+        """The table snapshot if it reflects the user's latest data version, else None"""
+        if self._synced_version.get(user) != self.versions.get(user):
+            return None
+        snapshots = self._snapshots.get(user)
+        return snapshots.get(table) if snapshots else None
+
+    def forget(self, user):
+        """Drop the user's snapshots; the next sync reloads them and listeners rebuild from the new version"""
+        with self._locks[user]:
+            self._snapshots.pop(user, None)
+            self._synced_version.pop(user, None)
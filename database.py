@@ -1,7 +1,13 @@
 import streamlit as st
 from supabase import create_client, Client
-import pandas as pd
-from datetime import datetime
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+from cache import TTLCache, make_key
+from date_ranges import month_range, current_month
+from categories import CategoryDictionary
 
 # Initialize Supabase client
 @st.cache_resource
@@ -17,62 +23,273 @@ def init_supabase():
 
 supabase = init_supabase()
 
-class ExpenseManager:
+# How long a remotely read data version is trusted before asking Supabase again
+VERSION_REFRESH_SECONDS = 5
+# Rows per bulk insert request; keeps each request body well under PostgREST limits
+INSERT_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+class DataVersionManager:
+    """Per-user monotonic data version, bumped by every write.
+
+    Versions are kept in-process and mirrored to the ``data_versions`` table
+    (user_email primary key, version bigint) so other processes can detect
+    changes with one tiny query. Versions are nanosecond timestamps, kept
+    above any version this process has seen from the table, and the table
+    is only ever moved up, so skewed clocks or late writes cannot lower it.
+    """
+
+    def __init__(self, supabase_client, clock=time.time_ns):
+        self.supabase = supabase_client
+        self.clock = clock
+        self._local = {}
+        self._remote = TTLCache(maxsize=10000, ttl=VERSION_REFRESH_SECONDS)
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="data-version")
+
+    def bump(self, user):
+        with self._lock:
+            # _local also holds the highest remote version seen (see get)
+            version = max(self._local.get(user, 0) + 1, self.clock())
+            self._local[user] = version
+        self._remote.pop(user)
+        if self.supabase:
+            self._writer.submit(self._store, user, version)
+        return version
+
+    def _store(self, user, version):
+        table = self.supabase.table("data_versions")
+        try:
+            for _ in range(2):
+                # Conditional update: a write that lands late must not lower the stored version
+                if table.update({"version": version}).eq("user_email", user).lt("version", version).execute().data:
+                    return
+                try:
+                    table.insert({"user_email": user, "version": version}).execute()
+                    return
+                except Exception:
+                    continue  # The row exists (perhaps just inserted elsewhere); retry the update
+        except Exception:
+            # The local version still advances; other processes catch up on the next write
+            logger.warning("Could not store the data version", exc_info=True)
+
+    def get(self, user):
+        """Current version for ``user`` (0 if the user has never written)"""
+        remote = self._remote.get(user)
+        if remote is None:
+            remote = self._fetch(user)
+            self._remote.set(user, remote)
+        with self._lock:
+            # Remembered so the next bump goes past it even after the remote entry expires
+            version = max(self._local.get(user, 0), remote)
+            self._local[user] = version
+            return version
+
+    def _fetch(self, user):
+        if not self.supabase:
+            return 0
+        try:
+            result = self.supabase.table("data_versions").select("version").eq("user_email", user).limit(1).execute()
+            return int(result.data[0]["version"]) if result.data else 0
+        except Exception:
+            return 0
+
+@st.cache_resource
+def get_data_versions():
+    return DataVersionManager(supabase)
+
+@st.cache_resource
+def get_category_dictionary():
+    return CategoryDictionary(supabase)
+
+class _VersionedManager(ABC):
+    """Shared plumbing: read results are cached per (user, query, data version).
+
+    When a change feed is attached and has a current snapshot of the user's
+    rows, reads are served from it without touching Supabase.
+    """
+    table = None
+    feed = None
+
     def __init__(self):
         self.supabase = supabase
+        self.versions = get_data_versions()
+        self._reads = TTLCache(maxsize=512, ttl=30 * 60)
+
+    def data_version(self, user):
+        return self.versions.get(user)
+
+    def _cached_read(self, user, query_key, fetch):
+        key = make_key(type(self).__name__, user, query_key, self.versions.get(user))
+        rows = self._reads.get(key)
+        if rows is None:
+            rows = fetch()
+            self._reads.set(key, rows)
+        return rows
+
+    def _changed(self, user):
+        self.versions.bump(user)
+        if self.feed:
+            # Pull this write's delta now: fragment reruns skip the app-level sync in ui.py
+            try:
+                self.feed.sync(user)
+            except Exception:
+                # The write stands; the next full run syncs again
+                logger.warning("Change feed sync after a %s write failed", self.table, exc_info=True)
+
+    def _snapshot(self, user):
+        return self.feed.current(user, self.table) if self.feed else None
+
+    def get_months(self, user):
+        """Months (YYYY-MM, newest first) that have rows"""
+        snapshot = self._snapshot(user)
+        if snapshot is not None:
+            return snapshot.months()
+        return sorted({str(r["date"])[:7] for r in self.get_records(user) if r.get("date")}, reverse=True)
+
+    def get_records(self, user, year_month=None):
+        """The user's rows as Supabase dicts, newest first (cached per data version)"""
+        if not self.supabase:
+            return []
+        try:
+            return self._records(user, year_month)
+        except Exception as e:
+            st.error(f"Error fetching {self.table}: {str(e)}")
+            return []
+
+    def get_frame(self, user, year_month=None):
+        """The user's rows as a typed transaction frame (see frames.py), built once per data version"""
+        if not self.supabase:
+            return self._to_frame(user, [])
+        try:
+            snapshot = self._snapshot(user)
+            if snapshot is not None:
+                # Keyed on this table's own revision: writes to other tables keep the frame
+                key = make_key(type(self).__name__, user, "frame", year_month, snapshot.revision, self._labels_serial(user))
+                frame = self._reads.get(key)
+                if frame is None:
+                    frame = self._to_frame(user, snapshot.records(year_month))
+                    self._reads.set(key, frame)
+                return frame
+            return self._cached_read(user, ("frame", self.table, year_month),
+                                     lambda: self._to_frame(user, self._records(user, year_month)))
+        except Exception as e:
+            st.error(f"Error fetching {self.table}: {str(e)}")
+            return self._to_frame(user, [])
+
+    def _records(self, user, year_month):
+        snapshot = self._snapshot(user)
+        if snapshot is not None:
+            return snapshot.records(year_month)
+        return self._cached_read(user, ("records", self.table, year_month), lambda: self._fetch_records(user, year_month))
+
+    @abstractmethod
+    def _to_frame(self, user, records):
+        """Raw rows -> the table's typed frame (see frames.py)"""
+
+    def _labels_serial(self, user):
+        """Identifies the lookup data ``_to_frame`` depends on besides the rows"""
+        return None
+
+    def _insert_many(self, user, rows):
+        """Bulk insert in INSERT_BATCH-sized requests; returns how many rows were stored.
+
+        A failed batch stops the import; the batches before it stay stored and are counted.
+        """
+        # PostgREST needs the same keys on every object of a bulk insert
+        columns = set().union(*rows)
+        rows = [{column: row.get(column) for column in columns} for row in rows]
+        inserted = 0
+        try:
+            for start in range(0, len(rows), INSERT_BATCH):
+                self.supabase.table(self.table).insert(rows[start:start + INSERT_BATCH]).execute()
+                inserted += len(rows[start:start + INSERT_BATCH])
+        except Exception as e:
+            st.error(f"Error importing {self.table} after {inserted} of {len(rows)} rows: {str(e)}")
+        if inserted:
+            self._changed(user)
+        return inserted
+
+    def _fetch_records(self, user, year_month):
+        query = self.supabase.table(self.table).select("*").eq("user_email", user)
+        if year_month:
+            start_date, end_date = month_range(year_month)
+            query = query.gte("date", start_date).lt("date", end_date)
+        return query.order("date", desc=True).execute().data
+
+    def delete_month(self, user, year_month):
+        if not self.supabase:
+            return False
+        
+        try:
+            start_date, end_date = month_range(year_month)
+            self.supabase.table(self.table).delete().eq("user_email", user).gte("date", start_date).lt("date", end_date).execute()
+            self._changed(user)
+            return True
+        except Exception as e:
+            st.error(f"Error deleting {self.table} for {year_month}: {str(e)}")
+            return False
 
-    def add_expense(self, user, cat, amt, dt_str):
+class ExpenseManager(_VersionedManager):
+    table = "expenses"
+
+    def __init__(self):
+        super().__init__()
+        self.categories = get_category_dictionary()
+
+    def _to_frame(self, user, records):
+        from frames import expense_frame  # deferred: pulls in pandas
+        return expense_frame(records, lambda ids, texts: self.categories.labels(user, ids, texts))
+
+    def _labels_serial(self, user):
+        return self.categories.serial(user)
+
+    def add_expense(self, user, cat, amt, dt_str, description=None):
         if not self.supabase or not cat or amt <= 0:
             return False
         
         try:
             data = {
                 "user_email": user,
-                "category": cat,
                 "amount": float(amt),
                 "date": dt_str
             }
+            if description:
+                data["description"] = str(description)  # Statement text, kept to train the auto-categorizer
+            category_id = self.categories.ensure(user, cat)
+            if category_id is not None:
+                data["category_id"] = category_id
+            else:
+                data["category"] = cat  # Dictionary unavailable; keep the name on the row
             result = self.supabase.table("expenses").insert(data).execute()
+            self._changed(user)
             return True
         except Exception as e:
             st.error(f"Error adding expense: {str(e)}")
             return False
 
-    def get_expenses(self, user, year_month=None):
-        if not self.supabase:
-            return []
+    def add_expenses(self, user, rows):
+        """Insert (category, amount, date, description) tuples in bulk; returns the number stored"""
+        if not self.supabase or not rows:
+            return 0
         
         try:
-            query = self.supabase.table("expenses").select("*").eq("user_email", user)
-            
-            if year_month:
-                # Filter by year-month (e.g., "2025-01")
-                start_date = f"{year_month}-01"
-                # Get last day of month
-                if year_month.endswith(('01', '03', '05', '07', '08', '10', '12')):
-                    end_date = f"{year_month}-31"
-                elif year_month.endswith(('04', '06', '09', '11')):
-                    end_date = f"{year_month}-30"
-                else:  # February
-                    end_date = f"{year_month}-29"
-                
-                query = query.gte("date", start_date).lte("date", end_date)
-            
-            result = query.order("date", desc=True).execute()
-            
-            # Convert to the format expected by your app (user, category, amount, date)
-            expenses = []
-            for row in result.data:
-                expenses.append((
-                    row['user_email'],
-                    row['category'],
-                    row['amount'],
-                    row['date']
-                ))
-            return expenses
+            category_ids = {name: self.categories.ensure(user, name) for name in {row[0] for row in rows}}
+            records = []
+            for cat, amt, dt_str, description in rows:
+                data = {"user_email": user, "amount": float(amt), "date": dt_str}
+                if category_ids[cat] is not None:
+                    data["category_id"] = category_ids[cat]
+                else:
+                    data["category"] = cat
+                if description:
+                    data["description"] = str(description)
+                records.append(data)
+            return self._insert_many(user, records)
         except Exception as e:
-            st.error(f"Error fetching expenses: {str(e)}")
-            return []
+            st.error(f"Error importing expenses: {str(e)}")
+            return 0
 
     def delete_expense(self, user, expense_id):
         if not self.supabase:
@@ -80,6 +297,7 @@ class ExpenseManager:
         
         try:
             result = self.supabase.table("expenses").delete().eq("id", expense_id).eq("user_email", user).execute()
+            self._changed(user)
             return True
         except Exception as e:
             st.error(f"Error deleting expense: {str(e)}")
@@ -89,11 +307,10 @@ class ExpenseManager:
         if not self.supabase:
             return False
         
-        current_month = datetime.now().strftime("%Y-%m")
         try:
-            start_date = f"{current_month}-01"
-            end_date = f"{current_month}-31"
-            result = self.supabase.table("expenses").delete().eq("user_email", user).gte("date", start_date).lte("date", end_date).execute()
+            start_date, end_date = month_range(current_month())
+            result = self.supabase.table("expenses").delete().eq("user_email", user).gte("date", start_date).lt("date", end_date).execute()
+            self._changed(user)
             return True
         except Exception as e:
             st.error(f"Error resetting current month: {str(e)}")
@@ -105,14 +322,46 @@ class ExpenseManager:
         
         try:
             result = self.supabase.table("expenses").delete().eq("user_email", user).execute()
+            self.categories.clear(user)
+            self._changed(user)
+            self._forget_local(user)
             return True
         except Exception as e:
             st.error(f"Error deleting all expenses: {str(e)}")
             return False
 
-class IncomeManager:
-    def __init__(self):
-        self.supabase = supabase
+    def _forget_local(self, user):
+        """Remove what was derived from the user's expenses and persisted locally"""
+        from resources import get_resource  # deferred: resources imports this module
+        get_resource("analytics").analyzer.isolation.forget(user)
+        get_resource("search").forget(user)
+
+    def merge_categories(self, user, source, target):
+        """Fold category ``source`` into ``target``; later entries of either name land in ``target``"""
+        if not self.supabase:
+            return False
+        
+        try:
+            # Names only seen on legacy rows get dictionary entries first
+            self.categories.ensure(user, source)
+            self.categories.ensure(user, target)
+            source_id, target_id = self.categories.merge(user, source, target)
+            self.supabase.table("expenses").update({"category_id": target_id}).eq("user_email", user).eq("category_id", source_id).execute()
+            if self.feed:
+                # The polling source only sees inserts and deletes; reload instead of applying stale rows
+                self.feed.forget(user)
+            self._changed(user)
+            return True
+        except Exception as e:
+            st.error(f"Error merging categories: {str(e)}")
+            return False
+
+class IncomeManager(_VersionedManager):
+    table = "income"
+
+    def _to_frame(self, user, records):
+        from frames import income_frame
+        return income_frame(records)
 
     def add_income(self, user, amt, dt_str):
         if not self.supabase or amt <= 0:
@@ -125,43 +374,22 @@ class IncomeManager:
                 "date": dt_str
             }
             result = self.supabase.table("income").insert(data).execute()
+            self._changed(user)
             return True
         except Exception as e:
             st.error(f"Error adding income: {str(e)}")
             return False
 
-    def get_income(self, user, year_month=None):
-        if not self.supabase:
-            return []
+    def add_incomes(self, user, rows):
+        """Insert (amount, date) tuples in bulk; returns the number stored"""
+        if not self.supabase or not rows:
+            return 0
         
         try:
-            query = self.supabase.table("income").select("*").eq("user_email", user)
-            
-            if year_month:
-                start_date = f"{year_month}-01"
-                if year_month.endswith(('01', '03', '05', '07', '08', '10', '12')):
-                    end_date = f"{year_month}-31"
-                elif year_month.endswith(('04', '06', '09', '11')):
-                    end_date = f"{year_month}-30"
-                else:
-                    end_date = f"{year_month}-29"
-                
-                query = query.gte("date", start_date).lte("date", end_date)
-            
-            result = query.order("date", desc=True).execute()
-            
-            # Convert to expected format (user, amount, date)
-            income = []
-            for row in result.data:
-                income.append((
-                    row['user_email'],
-                    row['amount'],
-                    row['date']
-                ))
-            return income
+            return self._insert_many(user, [{"user_email": user, "amount": float(amt), "date": dt_str} for amt, dt_str in rows])
         except Exception as e:
-            st.error(f"Error fetching income: {str(e)}")
-            return []
+            st.error(f"Error importing income: {str(e)}")
+            return 0
 
     def delete_income(self, user, income_id):
         if not self.supabase:
@@ -169,6 +397,7 @@ class IncomeManager:
         
         try:
             result = self.supabase.table("income").delete().eq("id", income_id).eq("user_email", user).execute()
+            self._changed(user)
             return True
         except Exception as e:
             st.error(f"Error deleting income: {str(e)}")
@@ -178,11 +407,10 @@ class IncomeManager:
         if not self.supabase:
             return False
         
-        current_month = datetime.now().strftime("%Y-%m")
         try:
-            start_date = f"{current_month}-01"
-            end_date = f"{current_month}-31"
-            result = self.supabase.table("income").delete().eq("user_email", user).gte("date", start_date).lte("date", end_date).execute()
+            start_date, end_date = month_range(current_month())
+            result = self.supabase.table("income").delete().eq("user_email", user).gte("date", start_date).lt("date", end_date).execute()
+            self._changed(user)
             return True
         except Exception as e:
             st.error(f"Error resetting current month income: {str(e)}")
@@ -194,6 +422,7 @@ class IncomeManager:
         
         try:
             result = self.supabase.table("income").delete().eq("user_email", user).execute()
+            self._changed(user)
             return True
         except Exception as e:
             st.error(f"Error deleting all income: {str(e)}")
@@ -201,68 +430,58 @@ class IncomeManager:
 
 class SpendingAnalyzer:
     def __init__(self, supabase_client):
+        from trends import TrendEngine  # deferred: pulls in pandas/scipy
+        from anomalies import AnomalyMonitor
+        from isolation import IsolationDetector
+        
         self.supabase = supabase_client
+        self.trends = TrendEngine()
+        self.anomalies = AnomalyMonitor(get_category_dictionary().label)
+        self.isolation = IsolationDetector()
         
-    def detect_spending_patterns(self, user):
-        if not self.supabase:
-            return self._empty_patterns()
+    def analyze(self, df, user=None, data_version=None):
+        """Compute spending patterns from a typed expense frame (see frames.expense_frame)"""
+        import pandas as pd
+        from frames import rupees
         
-        try:
-            result = self.supabase.table("expenses").select("*").eq("user_email", user).execute()
-            expenses = result.data
-            
-            if not expenses:
-                return self._empty_patterns()
-            
-            df = pd.DataFrame(expenses)
-            df['date'] = pd.to_datetime(df['date'])
-            df['day_of_week'] = df['date'].dt.dayofweek
-            
-            patterns = {
-                'peak_spending_day': df.groupby('day_of_week')['amount'].sum().idxmax(),
-                'avg_daily_spend': df.groupby(df['date'].dt.date)['amount'].sum().mean(),
-                'top_category': df.groupby('category')['amount'].sum().idxmax(),
-                'spending_trend': self._calculate_trend(df),
-                'unusual_expenses': self._detect_anomalies(df)
-            }
-            return patterns
-        except Exception as e:
-            st.error(f"Error analyzing spending patterns: {str(e)}")
+        if df is None or df.empty:
             return self._empty_patterns()
+        
+        trends = self.trends.update(user, df, data_version)
+        unusual = self.anomalies.unusual_expenses(user, df, data_version)
+        df = pd.DataFrame({
+            'category': df['category'],
+            'amount': rupees(df['amount']),
+            'date': df['date'],
+            'day_of_week': df['date'].dt.dayofweek,
+        })
+        
+        patterns = {
+            'peak_spending_day': int(df.groupby('day_of_week')['amount'].sum().idxmax()),
+            'avg_daily_spend': df.groupby('date')['amount'].sum().mean(),
+            'top_category': str(df.groupby('category', observed=True)['amount'].sum().idxmax()),
+            'spending_trend': self._calculate_trend(trends),
+            'unusual_expenses': unusual,
+            'daily_trends': trends.latest() if trends is not None else {}
+        }
+        return patterns
     
+    def detect_outliers(self, df, user, data_version):
+        """IsolationForest outliers over amount, weekday, day of month and category: (outliers, fresh)"""
+        return self.isolation.outliers(user, df, data_version)
+
     def _empty_patterns(self):
         return {
             'peak_spending_day': 'N/A',
             'avg_daily_spend': 0,
             'top_category': 'N/A',
             'spending_trend': 1,
-            'unusual_expenses': []
+            'unusual_expenses': [],
+            'daily_trends': {}
         }
     
-    def _calculate_trend(self, data):
-        if len(data) < 2:
+    def _calculate_trend(self, trends):
+        """Last 30 days' spend relative to the 30 days before (time-based, row order independent)"""
+        if trends is None:
             return 1
-        recent = data.tail(len(data)//2)['amount'].mean()
-        older = data.head(len(data)//2)['amount'].mean()
-        return recent / older if older > 0 else 1
-    
-    def _detect_anomalies(self, data):
-        if len(data) < 3:
-            return []
-        
-        category_means = data.groupby('category')['amount'].mean()
-        category_stds = data.groupby('category')['amount'].std()
-        
-        anomalies = []
-        for _, row in data.iterrows():
-            std = category_stds[row['category']]
-            if std > 0:
-                z_score = (row['amount'] - category_means[row['category']]) / std
-                if abs(z_score) > 2:
-                    anomalies.append({
-                        'date': row['date'].strftime('%Y-%m-%d'),
-                        'category': row['category'],
-                        'amount': row['amount'],
-                        'severity': 'high' if abs(z_score) > 3 else 'medium'
-                    })
-        return anomalies
+        return trends.ratio()
@@ -0,0 +1,27 @@
+from datetime import date, datetime
+
+def month_start(year_month):
+    """First day of a ``YYYY-MM`` month"""
+    year, month = (int(part) for part in year_month.split("-")[:2])
+    return date(year, month, 1)
+
+def next_month_start(year_month):
+    start = month_start(year_month)
+    if start.month == 12:
+        return date(start.year + 1, 1, 1)
+    return date(start.year, start.month + 1, 1)
+
+def month_range(year_month):
+    """Half-open ``[start, end)`` ISO date bounds for a ``YYYY-MM`` month.
+
+    Use with ``.gte("date", start).lt("date", end)`` so every month is exact
+    (no invalid dates like 2025-04-31) and the (user_email, date) index serves
+    the scan as a plain range.
+    """
+    return month_start(year_month).isoformat(), next_month_start(year_month).isoformat()
+
+def current_month():
+    return datetime.now().strftime("%Y-%m")
+
+def days_in_month(year_month):
+    return (next_month_start(year_month) - month_start(year_month)).days
@@ -0,0 +1,90 @@
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+from cache import TTLCache, make_key
+from categories import normalize_category
+
+def file_fingerprint(content):
+    """Digest of an uploaded file's bytes"""
+    return hashlib.sha256(content).hexdigest()
+
+def fingerprints(df):
+    """uint64 content hash per row of a typed frame: day, amount in paise and normalized description/category"""
+    text = df["category"].astype(str) if "category" in df else pd.Series("", index=df.index)
+    if "description" in df:
+        descriptions = df["description"].astype(str)
+        text = descriptions.where(descriptions != "", text)
+    keys = pd.DataFrame({
+        "day": df["date"].values.astype("datetime64[D]").astype(np.int64),
+        "amount": df["amount"].to_numpy(),
+        "text": text.map({t: normalize_category(t) for t in text.unique()}),
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+class UserIndex:
+    """Fingerprint counts of one user's stored rows in one table, as of ``version``"""
+
+    def __init__(self, version, ids, counts):
+        self.version = version
+        self.ids = ids
+        self.counts = counts
+
+class DedupeIndex:
+    """Local hash index of stored transactions, used to skip rows an import already added.
+
+    Each row is fingerprinted by day, amount and normalized description (or
+    category); counts are kept per fingerprint, so a statement that really
+    has two identical coffees on one day keeps both. Indexes are cached per
+    user and table, extended with just the new rows when a data version only
+    adds rows. Whole-file digests remember the data version an import left
+    behind, so re-submitting an unchanged file is a dictionary lookup.
+    """
+
+    def __init__(self):
+        self._indexes = TTLCache(maxsize=2048, ttl=24 * 60 * 60)
+        self._files = TTLCache(maxsize=4096, ttl=24 * 60 * 60)
+        self._lock = threading.Lock()
+
+    def seen_file(self, user, digest, data_version):
+        """Whether this exact file was imported and nothing has changed since"""
+        return self._files.get(make_key("file", user, digest)) == data_version
+
+    def record_file(self, user, digest, data_version):
+        self._files.set(make_key("file", user, digest), data_version)
+
+    def new_rows(self, user, table, df_stored, data_version, candidates):
+        """Boolean mask over the ``candidates`` frame: rows not yet stored, counting repeats"""
+        counts = self._counts(user, table, df_stored, data_version)
+        fp = fingerprints(candidates)
+        # The n-th copy of a fingerprint in the file is new only if fewer than n are stored
+        occurrence = pd.Series(fp).groupby(fp).cumcount().to_numpy()
+        stored = counts.reindex(fp, fill_value=0).to_numpy()
+        return occurrence >= stored
+
+    def _counts(self, user, table, df_stored, data_version):
+        key = make_key("rows", user, table)
+        index = self._indexes.get(key)
+        if index is not None and index.version == data_version:
+            return index.counts
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or index.version != data_version:
+                index = self._update(index, df_stored, data_version)
+                self._indexes.set(key, index)
+        return index.counts
+
+    def _update(self, index, df_stored, data_version):
+        ids = df_stored["id"].to_numpy()
+        if index is not None and np.isin(index.ids, ids, assume_unique=True).all():
+            added = df_stored[~np.isin(ids, index.ids, assume_unique=True)]
+            counts = index.counts.add(pd.Series(fingerprints(added)).value_counts(), fill_value=0).astype(np.int64)
+        else:
+            counts = pd.Series(fingerprints(df_stored)).value_counts()
+        return UserIndex(data_version, ids, counts)
+
+@st.cache_resource
+def get_dedupe_index():
+    """Process-wide import dedupe index"""
+    return DedupeIndex()
@@ -0,0 +1,121 @@
+import streamlit as st
+from cache import TTLCache, make_key
+from frames import rupees
+
+TOP_CATEGORIES = 5
+MONTHS_OF_HISTORY = 3
+MAX_ANOMALIES = 3
+# Rough budget for the context block; ~4 characters per token for English text
+TOKEN_BUDGET = 250
+CHARS_PER_TOKEN = 4
+
+@st.cache_resource
+def get_context_cache():
+    """Process-wide cache of built context digests, keyed by user and data version"""
+    return TTLCache(maxsize=1024, ttl=6 * 60 * 60)
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+class FinancialContextBuilder:
+    """Builds a bounded, ranked summary of a user's finances for LLM prompts.
+
+    The digest is computed once per (user, data version) and cached, so
+    building a prompt for each chat message is a dictionary lookup.
+    """
+
+    def __init__(self, top_n=TOP_CATEGORIES, token_budget=TOKEN_BUDGET, cache=None):
+        self.top_n = top_n
+        self.token_budget = token_budget
+        self.cache = cache if cache is not None else get_context_cache()
+
+    def get(self, user, data_version, df_exp, df_inc, analytics_data=None):
+        """The context digest for the user's frames at ``data_version`` (their ExpenseManager data version)"""
+        key = make_key(user, data_version, analytics_data)
+        context = self.cache.get(key)
+        if context is None:
+            context = self.build(df_exp, df_inc, analytics_data)
+            self.cache.set(key, context)
+        return context
+
+    def build(self, df_exp, df_inc, analytics_data=None):
+        # Lines are in priority order; the budget drops the tail first
+        lines = []
+        has_exp = df_exp is not None and not df_exp.empty
+        has_inc = df_inc is not None and not df_inc.empty
+        spent = float(rupees(df_exp["amount"].sum())) if has_exp else 0.0
+
+        if has_exp:
+            lines.append(f"Total spent ₹{spent:,.2f} across {len(df_exp)} transactions "
+                         f"(average ₹{rupees(df_exp['amount'].mean()):,.2f}).")
+        if has_inc:
+            earned = float(rupees(df_inc["amount"].sum()))
+            lines.append(f"Total income ₹{earned:,.2f} from {len(df_inc)} entries; "
+                         f"net balance ₹{earned - spent:,.2f}.")
+        if has_exp:
+            lines.append(self._top_categories(df_exp, spent))
+            monthly = self._monthly_deltas(df_exp)
+            if monthly:
+                lines.append(monthly)
+        if analytics_data:
+            trend = analytics_data.get("trend", 1)
+            trend_status = "increasing" if trend > 1.1 else "stable" if trend > 0.9 else "decreasing"
+            lines.append(f"Spending peaks on {analytics_data.get('peak_day', 'weekdays')}; "
+                         f"trend is {trend_status}.")
+        if has_exp:
+            anomalies = self._anomalies(df_exp)
+            if anomalies:
+                lines.append(anomalies)
+
+        return self._fit_budget(lines)
+
+    def _top_categories(self, df_exp, spent):
+        by_cat = rupees(df_exp.groupby("category", observed=True)["amount"].sum()).sort_values(ascending=False)
+        top = by_cat.head(self.top_n)
+        shown = ", ".join(
+            f"{cat} ₹{amt:,.0f} ({amt / spent * 100:.0f}%)" if spent else f"{cat} ₹{amt:,.0f}"
+            for cat, amt in top.items()
+        )
+        rest = len(by_cat) - len(top)
+        if rest > 0:
+            shown += f", {rest} other categories ₹{by_cat.iloc[len(top):].sum():,.0f}"
+        return f"Top categories: {shown}."
+
+    def _monthly_deltas(self, df_exp):
+        monthly = rupees(df_exp["amount"].groupby(df_exp["date"].dt.to_period("M")).sum()).sort_index()
+        monthly = monthly.tail(MONTHS_OF_HISTORY)
+        if len(monthly) < 2:
+            return None
+        parts = []
+        prev = None
+        for period, amt in monthly.items():
+            if prev:
+                parts.append(f"{period} ₹{amt:,.0f} ({(amt - prev) / prev * 100:+.0f}%)")
+            else:
+                parts.append(f"{period} ₹{amt:,.0f}")
+            prev = amt
+        return f"Monthly spend: {', '.join(parts)}."
+
+    def _anomalies(self, df_exp):
+        # Flag expenses far above their category's median
+        medians = df_exp.groupby("category", observed=True)["amount"].transform("median")
+        ratio = df_exp["amount"] / medians.where(medians > 0)
+        flagged = df_exp.assign(_ratio=ratio)[ratio >= 3].nlargest(MAX_ANOMALIES, "_ratio")
+        if flagged.empty:
+            return None
+        items = ", ".join(
+            f"₹{rupees(row.amount):,.0f} on {row.category} ({row.date:%Y-%m-%d})"
+            for row in flagged.itertuples(index=False)
+        )
+        return f"Unusual expenses: {items}."
+
+    def _fit_budget(self, lines):
+        out = []
+        used = 0
+        for line in lines:
+            cost = estimate_tokens(line) + 1
+            if used + cost > self.token_budget:
+                break
+            out.append(line)
+            used += cost
+        return " ".join(out)
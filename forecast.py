@@ -0,0 +1,189 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+import streamlit as st
+from cache import TTLCache, make_key
+from date_ranges import days_in_month
+from frames import rupees
+
+# Smoothing for each weekday's level; ~the last 6-7 occurrences of that weekday dominate
+EWM_ALPHA = 0.15
+RECURRING_MIN_MONTHS = 3
+RECURRING_DAY_TOLERANCE = 3
+# Amounts within ~15% of each other count as "the same" bill
+RECURRING_AMOUNT_TOLERANCE = 0.15
+
+def _weekday(days):
+    """Monday=0 weekday of datetime64[D] values (1970-01-01 was a Thursday)"""
+    return (np.asarray(days, dtype="datetime64[D]").view("int64") + 3) % 7
+
+def _frame(df_exp):
+    """Rupee view of a typed expense frame (see frames.expense_frame)"""
+    return pd.DataFrame({"category": df_exp["category"], "amount": rupees(df_exp["amount"]), "date": df_exp["date"]})
+
+def _days(df):
+    # pandas keeps at least second resolution, so day arithmetic needs an explicit view
+    return df["date"].values.astype("datetime64[D]")
+
+def detect_recurring(df):
+    """Recurring bills: same category and similar amount on a similar day in 3+ months.
+
+    Returns (items, mask) where mask flags the rows belonging to a recurring item.
+    """
+    if df.empty:
+        return [], np.zeros(0, dtype=bool)
+    dates = pd.DatetimeIndex(df["date"])
+    work = pd.DataFrame({
+        "category": df["category"].astype(str).str.strip().str.lower().values,
+        "bucket": np.round(np.log(df["amount"].clip(lower=1).values) / np.log1p(RECURRING_AMOUNT_TOLERANCE)),
+        "month": dates.to_period("M"),
+        "day": dates.day,
+        "amount": df["amount"].values,
+    })
+    stats = work.groupby(["category", "bucket"]).agg(
+        months=("month", "nunique"), rows=("month", "size"),
+        day_std=("day", "std"), day=("day", "median"), amount=("amount", "median"),
+    )
+    recurring = stats[(stats["months"] >= RECURRING_MIN_MONTHS)
+                      & (stats["rows"] <= stats["months"] * 1.25)
+                      & (stats["day_std"].fillna(0) <= RECURRING_DAY_TOLERANCE)]
+    keys = pd.MultiIndex.from_frame(work[["category", "bucket"]])
+    mask = keys.isin(recurring.index)
+    items = [
+        {"category": category, "bucket": bucket, "day": int(row.day), "amount": float(row.amount)}
+        for (category, bucket), row in recurring.iterrows()
+    ]
+    return items, np.asarray(mask)
+
+class WeekdayModel:
+    """Exponentially weighted daily spend level per weekday, fitted incrementally.
+
+    ``update`` only folds in days after ``fitted_through``; ``checksum`` guards
+    against edits to already-fitted history, which force a refit.
+    """
+
+    def __init__(self, alpha=EWM_ALPHA):
+        self.alpha = alpha
+        self.level = np.zeros(7)
+        self.seen = np.zeros(7, dtype=bool)
+        self.fitted_through = None
+        self.checksum = 0.0
+
+    def update(self, start, totals):
+        """Fold in daily totals (index 0 is ``start``) for days not yet fitted"""
+        first = 0 if self.fitted_through is None else int((self.fitted_through - start).astype(int)) + 1
+        new = totals[max(first, 0):]
+        if len(new) == 0:
+            return
+        new_start = start + np.timedelta64(max(first, 0), "D")
+        weekdays = _weekday(new_start + np.arange(len(new)))
+        decay = 1 - self.alpha
+        for wd in range(7):
+            values = new[weekdays == wd]
+            if len(values) == 0:
+                continue
+            if not self.seen[wd]:
+                # Seed with the first observation so early levels are not biased to zero
+                self.level[wd] = values[0]
+                values = values[1:]
+                self.seen[wd] = True
+            n = len(values)
+            if n:
+                weights = self.alpha * decay ** np.arange(n - 1, -1, -1)
+                self.level[wd] = decay ** n * self.level[wd] + float(weights @ values)
+        self.fitted_through = new_start + np.timedelta64(len(new) - 1, "D")
+        self.checksum = float(totals.sum())
+
+    def expected(self, weekdays):
+        fallback = self.level[self.seen].mean() if self.seen.any() else 0.0
+        levels = np.where(self.seen, self.level, fallback)
+        return levels[weekdays]
+
+class ForecastEngine:
+    """Month-end spending forecast from the already-loaded expense frame.
+
+    Forecast = spent so far + expected non-recurring spend for each remaining
+    day (by weekday) + recurring bills still due this month. Results are cached
+    per (user, data version, day); weekday models are kept per user and only
+    fitted on days added since the last fit.
+    """
+
+    def __init__(self):
+        self._models = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+        self._results = TTLCache(maxsize=1024, ttl=6 * 60 * 60)
+
+    def forecast(self, user, df_exp, data_version=None, today=None):
+        today = today or date.today()
+        key = make_key(user, data_version, today) if data_version is not None else None
+        if key is not None:
+            cached = self._results.get(key)
+            if cached is not None:
+                return cached
+        result = self._compute(user, _frame(df_exp), np.datetime64(today, "D"))
+        if key is not None:
+            self._results.set(key, result)
+        return result
+
+    def _compute(self, user, df, today):
+        year_month = str(today.astype("datetime64[M]"))
+        month_days = days_in_month(year_month)
+        day_of_month = int((today - today.astype("datetime64[M]").astype("datetime64[D]")).astype(int)) + 1
+        remaining_days = month_days - day_of_month
+        result = {
+            "month": year_month, "day": day_of_month, "days_in_month": month_days,
+            "remaining_days": remaining_days, "spent": 0.0, "predicted": 0.0,
+            "daily_average": 0.0, "baseline_remaining": 0.0, "recurring_pending": [],
+        }
+        if df.empty:
+            return result
+
+        days = _days(df)
+        in_month = (days >= today.astype("datetime64[M]").astype("datetime64[D]")) & (days <= today)
+        result["spent"] = float(df.loc[in_month, "amount"].sum())
+        result["daily_average"] = result["spent"] / day_of_month
+
+        items, recurring_mask = detect_recurring(df)
+        baseline = df[~recurring_mask]
+        model = self._fit(user, baseline, today)
+
+        if remaining_days > 0:
+            future = today + np.arange(1, remaining_days + 1)
+            weekdays = _weekday(future)
+            result["baseline_remaining"] = float(model.expected(weekdays).sum())
+
+        # Recurring bills due later this month that have not been paid yet
+        month_rows = df[in_month]
+        paid = set(zip(month_rows["category"].astype(str).str.strip().str.lower(),
+                       np.round(np.log(month_rows["amount"].clip(lower=1)) / np.log1p(RECURRING_AMOUNT_TOLERANCE))))
+        pending = [item for item in items
+                   if (item["category"], item["bucket"]) not in paid and day_of_month < item["day"] <= month_days]
+        result["recurring_pending"] = [{"category": i["category"], "amount": i["amount"], "day": i["day"]} for i in pending]
+
+        result["predicted"] = result["spent"] + result["baseline_remaining"] + sum(i["amount"] for i in pending)
+        return result
+
+    def _fit(self, user, baseline, today):
+        """Weekday model over completed days (before today), fitted incrementally"""
+        model = self._models.get(user) or WeekdayModel()
+        if baseline.empty:
+            return model
+        dates = _days(baseline)
+        start = dates.min()
+        yesterday = today - np.timedelta64(1, "D")
+        completed = dates <= yesterday
+        if not completed.any():
+            return model
+        idx = (dates[completed] - start).astype(int)
+        totals = np.bincount(idx, weights=baseline["amount"].values[completed],
+                             minlength=int((yesterday - start).astype(int)) + 1)
+        if model.fitted_through is not None:
+            fitted = int((model.fitted_through - start).astype(int)) + 1
+            if fitted > len(totals) or not np.isclose(totals[:fitted].sum(), model.checksum):
+                model = WeekdayModel()  # History before the last fit changed
+        model.update(start, totals)
+        self._models.set(user, model)
+        return model
+
+@st.cache_resource
+def get_forecast_engine():
+    return ForecastEngine()
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+PAISE_PER_RUPEE = 100
+EXPENSE_COLUMNS = ["id", "category", "amount", "date", "description"]
+INCOME_COLUMNS = ["id", "amount", "date"]
+
+def to_paise(amounts):
+    """Rupee amounts (numbers or numeric strings) as int64 paise; unparseable values become 0"""
+    values = pd.to_numeric(pd.Series(amounts, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=float)
+    return np.rint(values * PAISE_PER_RUPEE).astype(np.int64)
+
+def rupees(paise):
+    """Paise (scalar, array or Series) back to rupees for display and arithmetic"""
+    return paise / PAISE_PER_RUPEE
+
+def _typed_frame(records, columns, labels=None):
+    raw = pd.DataFrame(records, columns=columns + (["category_id"] if "category" in columns else []))
+    data = {"id": pd.to_numeric(raw["id"], errors="coerce").fillna(0).astype(np.int64)}
+    if "category" in columns:
+        names = raw["category"] if labels is None else labels(raw["category_id"], raw["category"])
+        data["category"] = names.fillna("").astype(str).str.strip().astype("category")
+    data["amount"] = to_paise(raw["amount"])
+    # pandas has no day resolution; whole days at second resolution is the closest
+    data["date"] = pd.to_datetime(raw["date"], errors="coerce").dt.normalize().astype("datetime64[s]")
+    if "description" in columns:
+        # Statement text from imports; most rows have none
+        data["description"] = raw["description"].fillna("").astype(str).str.strip().astype("category")
+    frame = pd.DataFrame(data, columns=columns)
+    return frame[frame["date"].notna()].reset_index(drop=True)
+
+def expense_frame(records, labels=None):
+    """Canonical expense frame: id int64, category categorical, amount int64 paise, date, description.
+
+    ``labels(category_ids, category_texts)`` resolves row category names (see
+    CategoryDictionary.labels). Built once at the data boundary and shared
+    between sessions, so treat it as read-only.
+    """
+    return _typed_frame(records, EXPENSE_COLUMNS, labels)
+
+def income_frame(records):
+    """Canonical income frame: id int64, amount int64 paise, date (read-only)"""
+    return _typed_frame(records, INCOME_COLUMNS)
+
+def display_frame(df):
+    """Category/Amount/Date view (rupees, ISO dates) used for charts, tables and exports"""
+    out = {}
+    if "category" in df:
+        out["Category"] = df["category"].astype(str)
+    out["Amount"] = rupees(df["amount"])
+    out["Date"] = df["date"].dt.strftime("%Y-%m-%d")
+    return pd.DataFrame(out)
@@ -0,0 +1,195 @@
+import re
+import pandas as pd
+import streamlit as st
+from frames import rupees
+
+# Example utterances per intent; the classifier matches questions against these.
+# Anything that is not a close match is open-ended advice and goes to the LLM.
+INTENT_EXAMPLES = {
+    "top_category": [
+        "what did i spend most on",
+        "where does most of my money go",
+        "which category do i spend the most on",
+        "biggest spending category",
+        "top expense category",
+    ],
+    "total_spent": [
+        "how much did i spend",
+        "total spending this month",
+        "total expenses",
+        "how much have i spent last month",
+        "what are my total expenses",
+    ],
+    "category_spent": [
+        "how much did i spend on food",
+        "how much do i spend on travel",
+        "total spent on groceries",
+        "spending on rent this month",
+    ],
+    "total_income": [
+        "how much did i earn",
+        "what is my total income",
+        "how much income this month",
+        "total earnings",
+    ],
+    "net_balance": [
+        "what is my net balance",
+        "how much did i save",
+        "am i saving money",
+        "what are my savings this month",
+        "income minus expenses",
+    ],
+    "largest_expense": [
+        "what was my largest expense",
+        "biggest purchase",
+        "most expensive transaction",
+    ],
+    "stock_price": [
+        "price of aapl",
+        "what is the price of tsla",
+        "stock price msft",
+        "current price of googl",
+    ],
+}
+
+MATCH_THRESHOLD = 0.65
+# Asking for guidance rather than a figure ("how can i...", "should i...", "tips") always goes to the LLM
+_ADVICE = re.compile(r"\b(?:how (?:can|could|should|do) i|should|why|tips?|advice|advise|suggest\w*|recommend\w*"
+                     r"|ideas?|ways? to|help me|enough|afford|reduce|cut|improve|better|plan\w*|strateg\w*|budget\w*)\b")
+# "spend on <category>", up to a period phrase or the end of the question
+_CATEGORY_MENTION = re.compile(r"\b(?:on|for)\s+(?!this\b|last\b|the\s+month\b)([a-z][\w &'-]*?)\s*"
+                               r"(?:\b(?:this|last|previous|current|in|during|so far)\b|[?.!]|$)")
+# Tickers are taken as written (uppercase), else the word after "price (of|for)"
+_SYMBOL = re.compile(r"\b([A-Z]{2,5})\b")
+_PRICE_OF = re.compile(r"\bprice\s+(?:of\s+|for\s+)?([A-Za-z]{1,5})\b", re.IGNORECASE)
+
+@st.cache_resource
+def get_intent_classifier():
+    """Shared classifier; fitting the tiny example set happens once per process"""
+    return IntentClassifier()
+
+class IntentClassifier:
+    """Nearest-example intent classifier over character n-gram TF-IDF vectors"""
+
+    def __init__(self, examples=INTENT_EXAMPLES, threshold=MATCH_THRESHOLD):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.threshold = threshold
+        self.labels = [intent for intent, texts in examples.items() for _ in texts]
+        corpus = [text for texts in examples.values() for text in texts]
+        self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True)
+        self.matrix = self.vectorizer.fit_transform(corpus)
+
+    def classify(self, question):
+        """Returns (intent, score); intent is None below the match threshold"""
+        vec = self.vectorizer.transform([question.lower()])
+        # Rows are L2-normalised, so the dot product is the cosine similarity
+        scores = (self.matrix @ vec.T).toarray().ravel()
+        best = int(scores.argmax())
+        score = float(scores[best])
+        return (self.labels[best] if score >= self.threshold else None), score
+
+class IntentRouter:
+    """Answers data lookups locally from the already-loaded frames.
+
+    ``route`` returns the answer text, or None when the question needs the LLM.
+    """
+
+    def __init__(self, classifier=None, price_lookup=None):
+        self.classifier = classifier or get_intent_classifier()
+        self.price_lookup = price_lookup
+        self.handlers = {
+            "top_category": self._top_category,
+            "total_spent": self._spent,
+            "category_spent": self._spent,
+            "total_income": self._total_income,
+            "net_balance": self._net_balance,
+            "largest_expense": self._largest_expense,
+            "stock_price": self._stock_price,
+        }
+
+    def route(self, question, df_exp=None, df_inc=None):
+        if _ADVICE.search(question.lower()):
+            return None
+        intent, _ = self.classifier.classify(question)
+        if intent is None:
+            return None
+        try:
+            return self.handlers[intent](question, df_exp, df_inc)
+        except Exception:
+            # A failed lookup is not worth an error message; let the LLM answer
+            return None
+
+    def _period(self, question, df):
+        """Filter ``df`` to the period mentioned in the question; returns (df, label)"""
+        q = question.lower()
+        if df is None or df.empty:
+            return df, "overall"
+        dates = df["date"]
+        today = pd.Timestamp.today().to_period("M")
+        if "last month" in q or "previous month" in q:
+            return df[dates.dt.to_period("M") == today - 1], "last month"
+        if "this month" in q or "current month" in q:
+            return df[dates.dt.to_period("M") == today], "this month"
+        if "this year" in q:
+            return df[dates.dt.year == today.year], "this year"
+        return df, "overall"
+
+    def _top_category(self, question, df_exp, df_inc):
+        df, label = self._period(question, df_exp)
+        if df is None or df.empty:
+            return f"📭 No expenses recorded {label}."
+        by_cat = rupees(df.groupby("category", observed=True)["amount"].sum()).sort_values(ascending=False)
+        total = by_cat.sum()
+        lines = [f"🏷️ You spent the most on **{by_cat.index[0]}** ({label}): "
+                 f"₹{by_cat.iloc[0]:,.2f} ({by_cat.iloc[0] / total * 100:.1f}% of spending)."]
+        if len(by_cat) > 1:
+            runners = ", ".join(f"{cat} ₹{amt:,.2f}" for cat, amt in by_cat.iloc[1:3].items())
+            lines.append(f"Next: {runners}.")
+        return "\n\n".join(lines)
+
+    def _spent(self, question, df_exp, df_inc):
+        df, label = self._period(question, df_exp)
+        if df is None or df.empty:
+            return f"📭 No expenses recorded {label}."
+        q = question.lower()
+        categories = [c for c in df_exp["category"].dropna().unique()
+                      if re.search(rf"\b{re.escape(str(c).strip().lower())}\b", q)]
+        if not categories:
+            if _CATEGORY_MENTION.search(q):
+                return None  # Asks about a category the user does not have; the LLM can say so
+            return f"💸 Total spent ({label}): **₹{rupees(df['amount'].sum()):,.2f}** across {len(df)} transactions."
+        matched = df[df["category"].isin(categories)]
+        if matched.empty:
+            return f"📭 No spending on {', '.join(map(str, categories))} recorded {label}."
+        names = ", ".join(str(c) for c in categories)
+        return f"🏷️ Spent on **{names}** ({label}): **₹{rupees(matched['amount'].sum()):,.2f}** in {len(matched)} transactions."
+
+    def _total_income(self, question, df_exp, df_inc):
+        df, label = self._period(question, df_inc)
+        if df is None or df.empty:
+            return f"📭 No income recorded {label}."
+        return f"💰 Total income ({label}): **₹{rupees(df['amount'].sum()):,.2f}** from {len(df)} entries."
+
+    def _net_balance(self, question, df_exp, df_inc):
+        exp, label = self._period(question, df_exp)
+        inc, _ = self._period(question, df_inc)
+        spent = rupees(exp["amount"].sum()) if exp is not None and not exp.empty else 0
+        earned = rupees(inc["amount"].sum()) if inc is not None and not inc.empty else 0
+        net = earned - spent
+        rate = f" — a {net / earned * 100:.1f}% savings rate" if earned > 0 else ""
+        return (f"📈 Net balance ({label}): **₹{net:,.2f}** "
+                f"(income ₹{earned:,.2f} − expenses ₹{spent:,.2f}){rate}.")
+
+    def _largest_expense(self, question, df_exp, df_inc):
+        df, label = self._period(question, df_exp)
+        if df is None or df.empty:
+            return f"📭 No expenses recorded {label}."
+        row = df.loc[df["amount"].idxmax()]
+        return f"🧾 Largest expense ({label}): **₹{rupees(row['amount']):,.2f}** on {row['category']} ({row['date']:%Y-%m-%d})."
+
+    def _stock_price(self, question, df_exp, df_inc):
+        match = _SYMBOL.search(question) or _PRICE_OF.search(question)
+        if not match or not self.price_lookup:
+            return None
+        return self.price_lookup(match.group(1))
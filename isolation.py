@@ -0,0 +1,183 @@
+import logging
+import os
+import threading
+import numpy as np
+from cache import TTLCache, make_key, owned_file, private_dir
+from categories import normalize_category
+from frames import rupees
+from jobs import JobQueue, JobLimitError
+
+MIN_TRAINING_ROWS = 50
+SCORE_BATCH = 4096
+MAX_OUTLIERS = 10
+N_ESTIMATORS = 100
+logger = logging.getLogger(__name__)
+MODEL_DIR = "models"  # under cache.DATA_DIR
+
+def category_stats(df_exp):
+    """Per-category share of rows and median log amount, fixed at training time"""
+    keys = df_exp["category"].astype(str).map(normalize_category)
+    log_amounts = np.log1p(rupees(df_exp["amount"].to_numpy()))
+    counts = keys.value_counts(normalize=True)
+    medians = keys.to_frame("key").assign(log_amount=log_amounts).groupby("key")["log_amount"].median()
+    return {
+        "share": counts.to_dict(),
+        "median": medians.to_dict(),
+        "global_median": float(np.median(log_amounts)),
+    }
+
+def features(df_exp, stats):
+    """Rows -> [log amount, amount vs category median, category share, weekday, day of month]"""
+    keys = df_exp["category"].astype(str).map(normalize_category)
+    log_amounts = np.log1p(rupees(df_exp["amount"].to_numpy()))
+    relative = log_amounts - keys.map(stats["median"]).fillna(stats["global_median"]).to_numpy()
+    share = keys.map(stats["share"]).fillna(0.0).to_numpy()
+    # Plain ordinals: trees split on thresholds, and every extra column dilutes the amount splits
+    weekday = df_exp["date"].dt.dayofweek.to_numpy()
+    day = df_exp["date"].dt.day.to_numpy()
+    return np.column_stack([log_amounts, relative, share, weekday, day])
+
+class TrainedModel:
+    def __init__(self, version, model, stats):
+        self.version = version
+        self.model = model
+        self.stats = stats
+
+class IsolationDetector:
+    """Multivariate outliers (amount, weekday, day of month, category) via IsolationForest.
+
+    Models are trained on a background worker and cached per user in memory
+    and on disk, tagged with the data version they were fitted on. Renders
+    only ever score: with the model for the current version if it exists,
+    otherwise with the last one while a retrain is queued. Scores are
+    computed in batches and cached per (user, data version).
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, jobs=None):
+        self.model_dir = model_dir
+        self.jobs = jobs or JobQueue(max_workers=1, per_user_limit=1)
+        self._models = TTLCache(maxsize=256, ttl=24 * 60 * 60)
+        self._results = TTLCache(maxsize=1024, ttl=6 * 60 * 60)
+        self._training = {}  # user -> version being fitted
+        self._retrain = {}  # user -> (df_exp, data_version) to fit once the running fit ends
+        self._lock = threading.Lock()
+
+    def outliers(self, user, df_exp, data_version):
+        """(outliers, fresh): most anomalous expenses, and whether the model matches ``data_version``"""
+        if df_exp is None or len(df_exp) < MIN_TRAINING_ROWS:
+            return [], True
+        key = make_key("isolation", user, data_version)
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached, True
+        trained = self._load(user)
+        fresh = trained is not None and trained.version == data_version
+        if not fresh:
+            self._schedule(user, df_exp, data_version)
+        if trained is None:
+            return [], False
+        result = self._score(trained, df_exp)
+        if fresh:
+            self._results.set(key, result)
+        return result, fresh
+
+    def _score(self, trained, df_exp):
+        X = features(df_exp, trained.stats)
+        scores = np.concatenate([trained.model.decision_function(X[i:i + SCORE_BATCH])
+                                 for i in range(0, len(X), SCORE_BATCH)])
+        worst = [i for i in np.argsort(scores)[:MAX_OUTLIERS] if scores[i] < 0]
+        dates = df_exp["date"].dt.strftime("%Y-%m-%d").to_numpy()
+        return [{
+            'id': int(df_exp["id"].iat[i]),
+            'date': dates[i],
+            'category': str(df_exp["category"].iat[i]),
+            'amount': float(rupees(df_exp["amount"].iat[i])),
+            'score': round(float(-scores[i]), 3),
+        } for i in worst]
+
+    def _schedule(self, user, df_exp, data_version):
+        with self._lock:
+            running = self._training.get(user)
+            if running == data_version:
+                return
+            if running is not None:
+                # Let the running fit finish and keep its model; it follows up with the latest version
+                self._retrain[user] = (df_exp, data_version)
+                return
+            self._training[user] = data_version
+        try:
+            self.jobs.submit(user, self._train, user, df_exp, data_version)
+        except JobLimitError:
+            # The queue is full; the next render retries
+            with self._lock:
+                self._training.pop(user, None)
+
+    def _train(self, job, user, df_exp, data_version):
+        from sklearn.ensemble import IsolationForest
+
+        # One fit per user at a time, so models land in version order
+        while True:
+            trained = None
+            try:
+                stats = category_stats(df_exp)
+                model = IsolationForest(n_estimators=N_ESTIMATORS, contamination="auto", random_state=0)
+                model.fit(features(df_exp, stats))
+                trained = TrainedModel(data_version, model, stats)
+            except Exception:
+                logger.warning("IsolationForest fit failed", exc_info=True)
+            with self._lock:
+                if self._training.get(user) != data_version:
+                    return  # The user's data was wiped while training
+                if trained is not None:
+                    self._models.set(user, trained)
+                follow = self._retrain.pop(user, None)
+                if follow is None:
+                    del self._training[user]
+                else:
+                    df_exp, data_version = follow
+                    self._training[user] = data_version
+            if trained is not None:
+                self._save(user, trained)
+            if follow is None:
+                return
+
+    def forget(self, user):
+        """Drop the user's model from memory and disk (their data was wiped)"""
+        with self._lock:
+            self._training.pop(user, None)
+            self._retrain.pop(user, None)
+            self._models.pop(user)
+        try:
+            os.remove(self._path(user))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, user):
+        return os.path.join(private_dir(self.model_dir), make_key("isolation", user)[:32] + ".joblib")
+
+    def _load(self, user):
+        trained = self._models.get(user)
+        if trained is not None:
+            return trained
+        try:
+            import joblib
+            path = self._path(user)
+            if not owned_file(path):
+                return None
+            data = joblib.load(path)
+            trained = TrainedModel(data["version"], data["model"], data["stats"])
+        except Exception:
+            return None
+        self._models.set(user, trained)
+        return trained
+
+    def _save(self, user, trained):
+        import joblib
+
+        try:
+            path = self._path(user)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            joblib.dump({"version": trained.version, "model": trained.model, "stats": trained.stats}, tmp)
+            os.replace(tmp, path)
+        except Exception:
+            pass  # Persistence is an optimization; the in-memory model still serves this process
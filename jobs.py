@@ -0,0 +1,128 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+MAX_WORKERS = 4
+PER_USER_LIMIT = 2
+# Finished jobs are kept this long so a rerun can still pick up the result
+RETENTION_SECONDS = 10 * 60
+
+class JobLimitError(Exception):
+    """Raised when a user already has the maximum number of active jobs"""
+
+class Job:
+    def __init__(self, user):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.finished_at = None
+        self._chunks = []
+        self._lock = threading.Lock()
+
+    def emit(self, text):
+        """Append a streamed chunk of output"""
+        with self._lock:
+            self._chunks.append(text)
+
+    @property
+    def partial(self):
+        with self._lock:
+            return "".join(self._chunks)
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+class JobQueue:
+    """Worker pool for slow calls (LLM generations) that must not block a script run.
+
+    ``submit`` returns a job id immediately; pages poll ``get`` for streamed
+    partial output and the final result, so a rerun does not lose the call.
+    The function receives the ``Job`` as its first argument and should check
+    ``job.cancelled`` and call ``job.emit`` while it streams.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, per_user_limit=PER_USER_LIMIT,
+                 retention=RETENTION_SECONDS, clock=time.monotonic):
+        self.per_user_limit = per_user_limit
+        self.retention = retention
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="neurobux-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user, fn, *args, **kwargs):
+        with self._lock:
+            self._purge()
+            active = sum(1 for job in self._jobs.values() if job.user == user and job.active)
+            if active >= self.per_user_limit:
+                raise JobLimitError(f"Please wait for your current request to finish (limit {self.per_user_limit}).")
+            job = Job(user)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        try:
+            job.result = fn(job, *args, **kwargs)
+            self._finish(job, CANCELLED if job.cancelled else DONE)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job, status):
+        job.finished_at = self.clock()
+        job.status = status
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or not job.active:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def active_jobs(self, user):
+        with self._lock:
+            return [job for job in self._jobs.values() if job.user == user and job.active]
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.active)
+
+    def _purge(self):
+        cutoff = self.clock() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at is not None and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False)
+
+@st.cache_resource
+def get_job_queue():
+    """Process-wide job queue shared by all sessions"""
+    return JobQueue()
@@ -0,0 +1,133 @@
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+from cache import TTLCache
+from frames import rupees, to_paise
+
+TABLES = ("income", "expenses")
+
+def _day(value):
+    return np.datetime64(pd.Timestamp(value).date(), "D")
+
+class UserLedger:
+    """One user's prefix sums: cumulative income and expense paise through each day that has rows.
+
+    ``days`` is sorted and unique; ``cumulative[table][i]`` is the total of
+    ``table`` up to and including ``days[i]``. Range totals and balances are
+    two binary searches; a write shifts the suffix after its day.
+    """
+
+    def __init__(self, version, days, cumulative, rows):
+        self.version = version
+        self.days = days
+        self.cumulative = cumulative
+        self.rows = rows  # (table, id) -> (day, paise), to undo deletes
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, version, frames):
+        """From {table: typed frame}"""
+        parts = {table: df for table, df in frames.items() if df is not None and not df.empty}
+        days = np.unique(np.concatenate([df["date"].values.astype("datetime64[D]") for df in parts.values()])) \
+            if parts else np.array([], dtype="datetime64[D]")
+        cumulative, rows = {}, {}
+        for table in TABLES:
+            df = parts.get(table)
+            if df is None:
+                cumulative[table] = np.zeros(len(days), dtype=np.int64)
+                continue
+            df_days = df["date"].values.astype("datetime64[D]")
+            amounts = df["amount"].to_numpy()
+            totals = np.bincount(np.searchsorted(days, df_days), weights=amounts, minlength=len(days))
+            cumulative[table] = np.cumsum(np.rint(totals).astype(np.int64))
+            rows.update(zip(((table, i) for i in df["id"].tolist()), zip(df_days, amounts.tolist())))
+        return cls(version, days, cumulative, rows)
+
+    def _through(self, table, day):
+        """Total of ``table`` up to and including ``day`` (paise)"""
+        i = np.searchsorted(self.days, day, side="right")
+        return int(self.cumulative[table][i - 1]) if i else 0
+
+    def totals(self, start, end):
+        """{income, expenses, net} in rupees for ``start``..``end`` inclusive"""
+        start, end = _day(start), _day(end)
+        with self.lock:
+            result = {table: rupees(self._through(table, end) - self._through(table, start - 1)) for table in TABLES}
+        result["net"] = result["income"] - result["expenses"]
+        return result
+
+    def balance(self, day):
+        """Running balance (income minus expenses, all time) at the end of ``day``"""
+        day = _day(day)
+        with self.lock:
+            return rupees(self._through("income", day) - self._through("expenses", day))
+
+    def timeline(self, start=None, end=None):
+        """Running balance at each day with rows in the range, starting from the balance carried into it"""
+        with self.lock:
+            lo = np.searchsorted(self.days, _day(start)) if start is not None else 0
+            hi = np.searchsorted(self.days, _day(end), side="right") if end is not None else len(self.days)
+            days = self.days[lo:hi]
+            balance = self.cumulative["income"][lo:hi] - self.cumulative["expenses"][lo:hi]
+            if start is not None and (len(days) == 0 or days[0] != _day(start)):
+                opening = self._through("income", _day(start) - 1) - self._through("expenses", _day(start) - 1)
+                days = np.concatenate(([_day(start)], days))
+                balance = np.concatenate(([opening], balance))
+        return pd.DataFrame({"Balance": rupees(balance)}, index=pd.to_datetime(days).rename("Date"))
+
+    def apply(self, table, op, row):
+        key = (table, row["id"])
+        if op == "INSERT":
+            if key in self.rows or not row.get("date"):
+                return
+            day, amount = _day(row["date"]), int(to_paise([row.get("amount")])[0])
+            i = np.searchsorted(self.days, day)
+            if i == len(self.days) or self.days[i] != day:
+                # A new day carries the totals of the day before it
+                self.days = np.insert(self.days, i, day)
+                for name in TABLES:
+                    self.cumulative[name] = np.insert(self.cumulative[name], i, self.cumulative[name][i - 1] if i else 0)
+            self.cumulative[table][i:] += amount
+            self.rows[key] = (day, amount)
+        elif op == "DELETE":
+            entry = self.rows.pop(key, None)
+            if entry is None:
+                return
+            day, amount = entry
+            self.cumulative[table][np.searchsorted(self.days, day):] -= amount
+
+class LedgerIndex:
+    """Per-user prefix-sum index over daily income and expense totals.
+
+    Built once per user from the typed frames, then kept current from
+    change-feed events (like AnomalyMonitor), so arbitrary date ranges and
+    running balances never rescan rows. A data version the events did not
+    cover triggers a rebuild.
+    """
+
+    def __init__(self):
+        self._ledgers = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+
+    def get(self, user, data_version, load_frames):
+        """The user's UserLedger at ``data_version``; ``load_frames()`` -> {table: frame} is only called to rebuild"""
+        ledger = self._ledgers.get(user)
+        if ledger is None or ledger.version != data_version:
+            ledger = UserLedger.build(data_version, load_frames())
+            self._ledgers.set(user, ledger)
+        return ledger
+
+    def on_changes(self, user, events, version):
+        """ChangeFeed listener: fold inserts and deletes into the prefix sums"""
+        ledger = self._ledgers.get(user)
+        if ledger is None:
+            return
+        with ledger.lock:
+            for event in events:
+                if event.table in TABLES:
+                    ledger.apply(event.table, event.op, event.row)
+            ledger.version = version
+
+@st.cache_resource
+def get_ledger_index():
+    return LedgerIndex()
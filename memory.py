@@ -0,0 +1,132 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+# Recent messages sent verbatim to the model
+WINDOW_MESSAGES = 6
+# Older messages are folded into the memo in batches of this size
+SUMMARY_BATCH = 6
+MEMO_MAX_CHARS = 1200
+PAGE_SIZE = 20
+
+@st.cache_resource
+def get_summary_executor():
+    """Small shared pool for background memo summarization"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+
+def compact_turns(turns, max_chars=160):
+    """Local fallback memo: one truncated line per turn"""
+    lines = []
+    for msg in turns:
+        who = "User" if msg["role"] == "user" else "SynBot"
+        text = " ".join(msg["content"].split())
+        if len(text) > max_chars:
+            text = text[:max_chars - 1] + "…"
+        lines.append(f"{who}: {text}")
+    return "\n".join(lines)
+
+def _merge(memo, addition):
+    return f"{memo}\n{addition}" if memo else addition
+
+class ConversationMemory:
+    """Chat history with a bounded model window and a rolling summary memo.
+
+    All messages are kept for display and export, but the model only sees the
+    memo plus the last ``window`` messages. Messages that fall out of the
+    window are summarized into the memo in the background.
+    """
+
+    def __init__(self, window=WINDOW_MESSAGES, batch=SUMMARY_BATCH,
+                 memo_max_chars=MEMO_MAX_CHARS, page_size=PAGE_SIZE):
+        self.window = window
+        self.batch = batch
+        self.memo_max_chars = memo_max_chars
+        self.page_size = page_size
+        self.messages = []
+        self.memo = ""
+        self._summarized = 0  # index of the first message not yet in the memo
+        self._pending = None
+        self._pending_end = 0
+        self._pending_chunk = []
+        self._lock = threading.Lock()
+
+    def add(self, role, content, welcome=False):
+        msg = {"role": role, "content": content}
+        if welcome:
+            msg["welcome"] = True
+        self.messages.append(msg)
+
+    def clear(self):
+        with self._lock:
+            self.messages = []
+            self.memo = ""
+            self._summarized = 0
+            self._pending = None
+            self._pending_end = 0
+
+    def _conversation(self):
+        return [m for m in self.messages if not m.get("welcome")]
+
+    def prompt_context(self):
+        """(memo, recent messages) to send with the next question.
+
+        Messages not yet folded into the memo stay in the window, which is
+        still bounded because summarization starts every ``batch`` messages.
+        """
+        self._collect()
+        turns = self._conversation()[self._summarized:]
+        return self.memo, turns[-(self.window + self.batch):]
+
+    def maybe_summarize(self, summarizer=None, executor=None):
+        """Fold messages that left the window into the memo, off the script thread.
+
+        ``summarizer(memo, turns)`` returns ``(text, ok)``; without one, or when
+        it fails, a truncated transcript is appended instead.
+        """
+        self._collect()
+        turns = self._conversation()
+        end = len(turns) - self.window
+        with self._lock:
+            if self._pending is not None or end - self._summarized < self.batch:
+                return
+            chunk = turns[self._summarized:end]
+            memo = self.memo
+            if summarizer is None or executor is None:
+                self._apply(_merge(memo, compact_turns(chunk)), end)
+                return
+            self._pending = executor.submit(summarizer, memo, chunk)
+            self._pending_end = end
+            self._pending_chunk = chunk
+
+    def _collect(self):
+        with self._lock:
+            future = self._pending
+            if future is None or not future.done():
+                return
+            self._pending = None
+            try:
+                text, ok = future.result()
+            except Exception:
+                text, ok = "", False
+            if not ok or not text:
+                text = _merge(self.memo, compact_turns(self._pending_chunk))
+            self._apply(text, self._pending_end)
+
+    def _apply(self, memo, end):
+        if len(memo) > self.memo_max_chars:
+            memo = "…" + memo[-(self.memo_max_chars - 1):]
+        self.memo = memo
+        self._summarized = end
+
+    def page_count(self):
+        older = max(len(self.messages) - self.page_size, 0)
+        return (older + self.page_size - 1) // self.page_size
+
+    def recent(self):
+        return self.messages[-self.page_size:]
+
+    def page(self, number):
+        """Older messages, page 1 being the oldest; excludes the recent page"""
+        older = self.messages[:max(len(self.messages) - self.page_size, 0)]
+        start = (number - 1) * self.page_size
+        return older[start:start + self.page_size]
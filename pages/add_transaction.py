@@ -2,13 +2,48 @@ import streamlit as st
 import pandas as pd
 from datetime import date, datetime
 from io import StringIO
+from resources import get_resource
+from dedupe import file_fingerprint
+from frames import expense_frame, income_frame
+
+# Free-text columns bank statements use for the transaction description
+DESCRIPTION_COLUMNS = ("Description", "Narration", "Particulars", "Details", "Remarks")
+LOW_CONFIDENCE = 0.5
+
+def _parse_rows(df_import, description_col=None):
+    """Valid import lines: amount (rupees), ISO date, category and description when present"""
+    rows = pd.DataFrame({
+        "amount": pd.to_numeric(df_import["Amount"], errors="coerce"),
+        "date": pd.to_datetime(df_import["Date"], errors="coerce", format="mixed").dt.strftime("%Y-%m-%d"),
+    })
+    valid = rows["amount"].gt(0) & rows["date"].notna()
+    if "Category" in df_import.columns:
+        rows["category"] = df_import["Category"].fillna("").astype(str).str.strip()
+        rows["description"] = df_import[description_col].fillna("").astype(str).str.strip() if description_col else ""
+        valid &= rows["category"] != ""
+    return rows[valid].reset_index(drop=True)
+
+def _import_summary(total, valid, added):
+    notes = []
+    if total > valid:
+        notes.append(f"{total - valid} lines skipped (missing or invalid amount/date)")
+    if valid > added:
+        notes.append(f"{valid - added} already imported")
+    if notes:
+        st.caption("ℹ️ " + "; ".join(notes) + ".")
+
+def _partial_import(stored, new, kind):
+    if stored:
+        st.warning(f"Imported {stored} of {new} new {kind} records before an error. "
+                   "Upload the file again to add the rest; rows already stored are skipped.")
+    else:
+        st.error(f"No {kind} records were imported.")
 
 def add_transaction_page(exp_mgr, inc_mgr):
     st.header(" Add Transaction")
 
     # Month Selector
-    all_expenses = exp_mgr.get_expenses(st.session_state.user_email)
-    months = sorted({e[3][:7] for e in all_expenses if e[3]}, reverse=True)
+    months = exp_mgr.get_months(st.session_state.user_email)
     if not months:
         months = [datetime.now().strftime("%Y-%m")]
 
@@ -28,45 +63,68 @@ def add_transaction_page(exp_mgr, inc_mgr):
     # --- Import CSV Section ---
     st.subheader("📥 Import from CSV")
 
-    uploaded_file = st.file_uploader("Upload CSV file for Import", type=["csv"], help="CSV for expenses should have columns: Category, Amount, Date. For income: Amount, Date")
+    uploaded_file = st.file_uploader("Upload CSV file for Import", type=["csv"], help="CSV for expenses should have columns: Category, Amount, Date. Bank statements with a "
+                                          "Description (or Narration) column instead of Category are categorized "
+                                          "automatically. For income: Amount, Date")
 
     if uploaded_file:
         try:
-            file_content = StringIO(uploaded_file.getvalue().decode("utf-8"))
-            df_import = pd.read_csv(file_content)
-            
-            # Determine if import is expense or income by presence of 'Category' column
-            if "Category" in df_import.columns:
-                # Treat as Expenses
-                required_cols = {"Category", "Amount", "Date"}
-                if not required_cols.issubset(set(df_import.columns)):
-                    st.error("Expense import must have columns: Category, Amount, Date")
-                else:
-                    count_added = 0
-                    for _, row in df_import.iterrows():
-                        try:
-                            category = str(row['Category'])
-                            amount = float(row['Amount'])
-                            date_str = str(row['Date'])
-                            exp_mgr.add_expense(st.session_state.user_email, category, amount, date_str)
-                            count_added += 1
-                        except Exception as e:
-                            continue
-                    st.success(f"Imported {count_added} expense records successfully.")
-            elif {"Amount", "Date"}.issubset(set(df_import.columns)):
-                # Treat as Income
-                count_added = 0
-                for _, row in df_import.iterrows():
-                    try:
-                        amount = float(row['Amount'])
-                        date_str = str(row['Date'])
-                        inc_mgr.add_income(st.session_state.user_email, amount, date_str)
-                        count_added += 1
-                    except:
-                        continue
-                st.success(f"Imported {count_added} income records successfully.")
+            user = st.session_state.user_email
+            content = uploaded_file.getvalue()
+            dedupe = get_resource("dedupe")
+            digest = file_fingerprint(content)
+            if dedupe.seen_file(user, digest, exp_mgr.data_version(user)):
+                # Every rerun resubmits the uploaded file; an unchanged re-import has nothing to add
+                st.info("✅ This file has already been imported.")
             else:
-                st.error("CSV format not recognized for import.")
+                df_import = pd.read_csv(StringIO(content.decode("utf-8")))
+                description_col = next((c for c in DESCRIPTION_COLUMNS if c in df_import.columns), None)
+
+                # Determine if import is expense or income by presence of 'Category' column
+                if "Category" not in df_import.columns and description_col and {"Amount", "Date"}.issubset(set(df_import.columns)):
+                    # Statement lines: categories predicted from the user's own history in one batch
+                    categories, confidence = get_resource("categorizer").categorize(
+                        user, exp_mgr.get_frame(user), exp_mgr.data_version(user), df_import[description_col])
+                    df_import["Category"] = categories
+                    df_import["Confidence"] = confidence
+
+                if "Category" in df_import.columns:
+                    # Treat as Expenses
+                    required_cols = {"Category", "Amount", "Date"}
+                    if not required_cols.issubset(set(df_import.columns)):
+                        st.error("Expense import must have columns: Category, Amount, Date")
+                    else:
+                        rows = _parse_rows(df_import, description_col)
+                        new = rows[dedupe.new_rows(user, "expenses", exp_mgr.get_frame(user), exp_mgr.data_version(user),
+                                                   expense_frame(rows.assign(id=0)))]
+                        count_added = exp_mgr.add_expenses(
+                            user, list(new[["category", "amount", "date", "description"]].itertuples(index=False, name=None)))
+                        if count_added == len(new):
+                            dedupe.record_file(user, digest, exp_mgr.data_version(user))
+                            st.success(f"Imported {count_added} expense records successfully.")
+                        else:
+                            _partial_import(count_added, len(new), "expense")
+                        _import_summary(len(df_import), len(rows), len(new))
+                        if "Confidence" in df_import.columns:
+                            unsure = int((df_import["Confidence"] < LOW_CONFIDENCE).sum())
+                            st.caption(f"🏷️ Categories were predicted from your history"
+                                       + (f"; {unsure} lines had low confidence, review them under View Expenses." if unsure else "."))
+                            st.dataframe(df_import[[description_col, "Amount", "Date", "Category", "Confidence"]],
+                                         hide_index=True, use_container_width=True)
+                elif {"Amount", "Date"}.issubset(set(df_import.columns)):
+                    # Treat as Income
+                    rows = _parse_rows(df_import)
+                    new = rows[dedupe.new_rows(user, "income", inc_mgr.get_frame(user), inc_mgr.data_version(user),
+                                               income_frame(rows.assign(id=0)))]
+                    count_added = inc_mgr.add_incomes(user, list(new[["amount", "date"]].itertuples(index=False, name=None)))
+                    if count_added == len(new):
+                        dedupe.record_file(user, digest, inc_mgr.data_version(user))
+                        st.success(f"Imported {count_added} income records successfully.")
+                    else:
+                        _partial_import(count_added, len(new), "income")
+                    _import_summary(len(df_import), len(rows), len(new))
+                else:
+                    st.error("CSV format not recognized for import.")
         except Exception as e:
             st.error(f"Error processing file: {e}")
 
@@ -92,8 +150,15 @@ def add_transaction_page(exp_mgr, inc_mgr):
                 elif amount <= 0:
                     st.error("Amount must be greater than zero.")
                 else:
-                    exp_mgr.add_expense(st.session_state.user_email, category, amount, str(tx_date))
+                    # Scored against the category's history before this expense joins it
+                    user = st.session_state.user_email
+                    score, level = get_resource("analytics").score_expense(
+                        user, exp_mgr.get_frame(user), exp_mgr.data_version(user), category, amount)
+                    exp_mgr.add_expense(user, category, amount, str(tx_date))
                     st.success("Expense saved!")
+                    if level:
+                        st.warning(f"⚠️ This is unusually {'high' if score > 0 else 'low'} for {category} "
+                                   f"({level} severity). Double-check the amount.")
             else:
                 if amount <= 0:
                     st.error("Income amount must be greater than zero.")
@@ -101,3 +166,16 @@ def add_transaction_page(exp_mgr, inc_mgr):
                     inc_mgr.add_income(st.session_state.user_email, amount, str(tx_date))
                     st.success("Income saved!")
 
+    # --- Category Merging ---
+    with st.expander("🏷️ Merge Categories"):
+        names = sorted(exp_mgr.get_frame(st.session_state.user_email)["category"].cat.categories, key=str.casefold)
+        if len(names) < 2:
+            st.caption("Add expenses in at least two categories to merge them.")
+        else:
+            col1, col2 = st.columns(2)
+            source = col1.selectbox("Merge", names, key="merge_source")
+            target = col2.selectbox("Into", [name for name in names if name != source], key="merge_target")
+            if st.button("Merge", key="merge_categories"):
+                if exp_mgr.merge_categories(st.session_state.user_email, source, target):
+                    st.success(f"Merged {source} into {target}.")
+
@@ -1,44 +1,68 @@
 import streamlit as st
-import pandas as pd
-from database import SpendingAnalyzer
+from datetime import datetime
+from resources import get_resource
+from frames import rupees
+from memory import ConversationMemory, get_summary_executor
+from jobs import get_job_queue, JobLimitError, DONE, CANCELLED
+
+def _generate_answer(job, synbot, prompt, df_exp, df_inc, analytics_data, user, data_version, history, memo):
+    """Runs on the job queue's worker pool, streaming chunks into the job"""
+    return synbot.answer(prompt, df_exp, df_inc, analytics_data, user=user, data_version=data_version,
+                         history=history, memo=memo, on_delta=job.emit, cancel_event=job.cancel_event)
+
+@st.fragment(run_every=0.5)
+def _pending_answer(memory, synbot):
+    """Polls the in-flight answer without rerunning the rest of the page"""
+    jobs = get_job_queue()
+    job_id = st.session_state.get("coach_job_id")
+    job = jobs.get(job_id) if job_id else None
+    if job is None:
+        st.session_state.coach_job_id = None
+        return
+
+    if job.active:
+        with st.chat_message("assistant"):
+            st.markdown(job.partial or "SynBot is analyzing your financial data...")
+            if st.button("⏹️ Stop generating", key="cancel_coach_job"):
+                jobs.cancel(job_id)
+        return
+
+    st.session_state.coach_job_id = None
+    if job.status == DONE:
+        answer = job.result
+    elif job.status == CANCELLED:
+        answer = f"{job.partial}\n\n*(stopped)*" if job.partial else "*(stopped)*"
+    else:
+        answer = f"🤖 Error: {job.error}"
+
+    # Add assistant response to chat history
+    memory.add("assistant", answer)
+    memory.maybe_summarize(synbot.summarize, get_summary_executor())
+    st.rerun()
 
 def ai_coach_page(exp_mgr, inc_mgr, synbot):
     st.header(" NeuroBot ")
     st.markdown("*Get personalized financial advice based on your spending and income data*")
 
-    # Get user's financial data
-    exp_data = exp_mgr.get_expenses(st.session_state.user_email)
-    inc_data = inc_mgr.get_income(st.session_state.user_email)
+    # Get user's financial data (served from cache unless the data version changed)
+    data_version = exp_mgr.data_version(st.session_state.user_email)
+    df_exp = exp_mgr.get_frame(st.session_state.user_email)
+    df_inc = inc_mgr.get_frame(st.session_state.user_email)
 
-    df_exp = pd.DataFrame(exp_data, columns=["User", "Category", "Amount", "Date"])
-    df_inc = pd.DataFrame(inc_data, columns=["User", "Amount", "Date"])
-
-    if df_exp.empty:
-        df_exp = pd.DataFrame(columns=["User", "Category", "Amount", "Date"])
-    if df_inc.empty:
-        df_inc = pd.DataFrame(columns=["User", "Amount", "Date"])
-
-    # Get analytics data for enhanced context
+    # Get analytics data for enhanced context (shared with Smart Analytics, cached per data version)
     analytics_data = None
-    if not df_exp.empty:
-        try:
-            analyzer = SpendingAnalyzer(exp_mgr.conn)
-            patterns = analyzer.detect_spending_patterns(st.session_state.user_email)
-            analytics_data = {
-                'peak_day': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][patterns.get('peak_spending_day', 0)],
-                'trend': patterns.get('spending_trend', 1),
-                'top_category': patterns.get('top_category', 'miscellaneous')
-            }
-        except Exception:
-            analytics_data = None
+    try:
+        analytics_data = get_resource("analytics").get_coach_context(st.session_state.user_email, df_exp, data_version)
+    except Exception as e:
+        st.warning(f"Spending pattern analysis unavailable: {str(e)}")
 
     # Financial summary display
     if not df_exp.empty or not df_inc.empty:
         st.subheader("📊 Your Financial Summary")
         col1, col2, col3 = st.columns(3)
         
-        total_spent = df_exp["Amount"].sum() if not df_exp.empty else 0
-        total_income = df_inc["Amount"].sum() if not df_inc.empty else 0
+        total_spent = rupees(df_exp["amount"].sum())
+        total_income = rupees(df_inc["amount"].sum())
         net_balance = total_income - total_spent
         
         col1.metric("💸 Total Expenses", f"₹{total_spent:,.2f}")
@@ -75,9 +99,9 @@ def ai_coach_page(exp_mgr, inc_mgr, synbot):
     # Chat interface
     st.subheader("💬 Chat with NeuroBot")
     
-    # Initialize messages
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    # Initialize conversation memory
+    if "chat_memory" not in st.session_state:
+        st.session_state.chat_memory = ConversationMemory()
         # Add welcome message
         welcome_msg = """👋 Hello! I'm NeuroBot, your personal financial coach. I'm here to help you understand your spending habits, create better budgets, and achieve your financial goals.
 
@@ -89,54 +113,75 @@ I can analyze your expense and income data to provide personalized advice. Feel
 • Debt management
 
 What would you like to know about your finances today?"""
-        st.session_state.messages.append({"role": "assistant", "content": welcome_msg})
+        st.session_state.chat_memory.add("assistant", welcome_msg, welcome=True)
+    memory = st.session_state.chat_memory
+
+    # Older messages are paged inside a collapsed expander; only the latest page renders inline
+    pages = memory.page_count()
+    if pages:
+        with st.expander(f"🕘 Earlier messages ({len(memory.messages) - len(memory.recent())})"):
+            page = st.number_input("Page", min_value=1, max_value=pages, value=pages, key="chat_history_page")
+            for msg in memory.page(page):
+                st.markdown(f"**{'You' if msg['role'] == 'user' else 'NeuroBot'}:** {msg['content']}")
 
     # Display chat messages
-    for msg in st.session_state.messages:
+    for msg in memory.recent():
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
 
-    # Handle suggested questions
-    if hasattr(st.session_state, 'suggested_question'):
+    # One answer at a time: a new question would orphan the running job, so input waits
+    # (a suggested question stays queued until the answer lands and the page reruns)
+    busy = bool(st.session_state.get("coach_job_id"))
+    if hasattr(st.session_state, 'suggested_question') and not busy:
         prompt = st.session_state.suggested_question
         delattr(st.session_state, 'suggested_question')
     else:
-        prompt = st.chat_input("Ask me anything about your finances...")
+        prompt = st.chat_input("Ask me anything about your finances...", disabled=busy)
+
+    if prompt and not busy:
+        # Bounded history: rolling memo plus the most recent turns
+        memo, history = memory.prompt_context()
 
-    if prompt:
         # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        memory.add("user", prompt)
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Generate AI response with enhanced context
-        with st.chat_message("assistant"):
-            with st.spinner("SynBot is analyzing your financial data..."):
-                answer = synbot.answer(prompt, df_exp, df_inc, analytics_data)
-                st.markdown(answer)
-                
-        # Add assistant response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": answer})
+        # Generate AI response on the worker pool; the fragment below streams it in
+        try:
+            st.session_state.coach_job_id = get_job_queue().submit(
+                st.session_state.user_email, _generate_answer, synbot, prompt, df_exp, df_inc,
+                analytics_data, st.session_state.user_email, data_version, history, memo
+            )
+            st.rerun()  # Redraw with the input disabled while the answer streams in
+        except JobLimitError as e:
+            st.warning(str(e))
+
+    if st.session_state.get("coach_job_id"):
+        _pending_answer(memory, synbot)
 
     # Quick actions sidebar
     with st.sidebar:
         st.markdown("### 🎯 Quick Actions")
         
         if st.button("🔄 Clear Chat History", key="clear_chat"):
-            st.session_state.messages = []
+            if st.session_state.get("coach_job_id"):
+                get_job_queue().cancel(st.session_state.coach_job_id)
+                st.session_state.coach_job_id = None
+            memory.clear()
             st.rerun()  # ✅ UPDATED: Changed from st.experimental_rerun()
         
         if st.button("📤 Export Chat", key="export_chat"):
-            if st.session_state.messages:
+            if memory.messages:
                 chat_content = ""
-                for msg in st.session_state.messages:
+                for msg in memory.messages:
                     role = "You" if msg["role"] == "user" else "SynBot"
                     chat_content += f"{role}: {msg['content']}\n\n"
                 
                 st.download_button(
                     "💾 Download Chat History",
                     data=chat_content.encode('utf-8'),
-                    file_name=f"synbot_chat_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                    file_name=f"synbot_chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
                     mime="text/plain"
                 )
 
@@ -1,14 +1,24 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
-from utils import export_df_to_csv, export_df_to_pdf
+from datetime import datetime, date, timedelta
+from utils import export_df_to_csv, export_df_to_pdf, cached_export
+from frames import rupees
+from resources import get_resource
+
+# Range presets for the balance chart; None starts at the first transaction
+BALANCE_RANGES = {
+    "Last 45 days": lambda today: today - timedelta(days=45),
+    "Last 90 days": lambda today: today - timedelta(days=90),
+    "This year": lambda today: date(today.year, 1, 1),
+    "All time": lambda today: None,
+    "Custom": None,
+}
 
 def dashboard_page(exp_mgr, inc_mgr):
     st.header("Dashboard")
 
-    all_expenses = exp_mgr.get_expenses(st.session_state.user_email)
-    months = sorted({e[3][:7] for e in all_expenses if e[3]}, reverse=True)
+    months = exp_mgr.get_months(st.session_state.user_email)
     if not months:
         months = [datetime.now().strftime("%Y-%m")]
 
@@ -23,19 +33,12 @@ def dashboard_page(exp_mgr, inc_mgr):
     )
     st.session_state.selected_month = selected_month
 
-    exp_data = exp_mgr.get_expenses(st.session_state.user_email, year_month=selected_month)
-    inc_data = inc_mgr.get_income(st.session_state.user_email, year_month=selected_month)
+    data_version = exp_mgr.data_version(st.session_state.user_email)
+    df_exp = exp_mgr.get_frame(st.session_state.user_email, year_month=selected_month)
+    df_inc = inc_mgr.get_frame(st.session_state.user_email, year_month=selected_month)
 
-    df_exp = pd.DataFrame(exp_data, columns=["User", "Category", "Amount", "Date"])
-    df_inc = pd.DataFrame(inc_data, columns=["User", "Amount", "Date"])
-
-    if df_exp.empty:
-        df_exp = pd.DataFrame(columns=["User", "Category", "Amount", "Date"])
-    if df_inc.empty:
-        df_inc = pd.DataFrame(columns=["User", "Amount", "Date"])
-
-    total_spent = df_exp["Amount"].sum()
-    total_income = df_inc["Amount"].sum()
+    total_spent = rupees(df_exp["amount"].sum())
+    total_income = rupees(df_inc["amount"].sum())
     net = total_income - total_spent
 
     col1, col2, col3 = st.columns(3)
@@ -44,23 +47,62 @@ def dashboard_page(exp_mgr, inc_mgr):
     col3.metric("💰 Net", f"₹{net:,.2f}")
 
     if not df_exp.empty:
-        df_exp["Date"] = pd.to_datetime(df_exp["Date"], errors='coerce')
-        fig = px.bar(df_exp, x="Date", y="Amount", color="Category", template="plotly_dark")
+        fig = px.bar(x=df_exp["date"], y=rupees(df_exp["amount"]), color=df_exp["category"].astype(str),
+                     labels={"x": "Date", "y": "Amount", "color": "Category"}, template="plotly_dark")
         st.plotly_chart(fig, use_container_width=True)
 
     if not df_exp.empty or not df_inc.empty:
-        df_exp_plot = df_exp[["Date", "Amount"]].copy()
-        df_exp_plot["Type"] = "Expense"
-        df_inc_plot = df_inc[["Date", "Amount"]].copy()
-        df_inc_plot["Type"] = "Income"
-        df_combined = pd.concat([df_exp_plot, df_inc_plot], ignore_index=True)
-        if not df_combined.empty:
-            df_combined["Date"] = pd.to_datetime(df_combined["Date"], errors='coerce')
-            fig2 = px.bar(df_combined, x="Date", y="Amount", color="Type", template="plotly_dark")
-            st.plotly_chart(fig2, use_container_width=True)
-
-    # --- EXPORT Buttons ---
+        df_combined = pd.DataFrame({
+            "Date": pd.concat([df_exp["date"], df_inc["date"]], ignore_index=True),
+            "Amount": rupees(pd.concat([df_exp["amount"], df_inc["amount"]], ignore_index=True)),
+            "Type": ["Expense"] * len(df_exp) + ["Income"] * len(df_inc),
+        })
+        fig2 = px.bar(df_combined, x="Date", y="Amount", color="Type", template="plotly_dark")
+        st.plotly_chart(fig2, use_container_width=True)
+
+    # Sections below are fragments: their widgets rerun only their own section
     st.markdown("---")
+    _balance_section(exp_mgr, inc_mgr)
+    st.markdown("---")
+    _export_panel(df_exp, df_inc, selected_month, data_version)
+    st.markdown("---")
+    _data_management(exp_mgr, inc_mgr)
+
+@st.fragment
+def _balance_section(exp_mgr, inc_mgr):
+    # --- BALANCE OVER TIME (any date range, served by the prefix-sum ledger) ---
+    st.subheader("📈 Balance Over Time")
+
+    user = st.session_state.user_email
+    ledger = get_resource("ledger").get(user, exp_mgr.data_version(user), lambda: {
+        "expenses": exp_mgr.get_frame(user), "income": inc_mgr.get_frame(user)})
+    today = date.today()
+    period = st.selectbox("Range", list(BALANCE_RANGES), key="balance_range")
+    if BALANCE_RANGES[period] is None:
+        picked = st.date_input("From / To", value=(today - timedelta(days=45), today), key="balance_custom")
+        start, end = (picked[0], picked[-1]) if picked else (today, today)
+    else:
+        start, end = BALANCE_RANGES[period](today), today
+    if start is None:
+        start = ledger.days[0].astype(date) if len(ledger.days) else today
+
+    totals = ledger.totals(start, end)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("💵 Income", f"₹{totals['income']:,.2f}")
+    col2.metric("💸 Spent", f"₹{totals['expenses']:,.2f}")
+    col3.metric("💰 Net", f"₹{totals['net']:,.2f}")
+    col4.metric("🏦 Balance", f"₹{ledger.balance(end):,.2f}")
+
+    timeline = ledger.timeline(start, end)
+    if len(timeline) > 1:
+        fig3 = px.line(timeline, y="Balance", line_shape="hv", template="plotly_dark")
+        st.plotly_chart(fig3, use_container_width=True)
+    else:
+        st.info("No transactions in this range yet.")
+
+@st.fragment
+def _export_panel(df_exp, df_inc, selected_month, data_version):
+    # --- EXPORT Buttons ---
     st.subheader("📤 Export Data")
 
     col1, col2 = st.columns(2)
@@ -68,11 +110,9 @@ def dashboard_page(exp_mgr, inc_mgr):
     with col1:
         if not df_exp.empty and len(df_exp) > 0:
             try:
-                # Remove User column if it exists and ensure data is clean
-                export_df_exp = df_exp.drop(columns=["User"], errors='ignore')
-                
-                csv_bytes_exp = export_df_to_csv(export_df_exp)
-                pdf_bytes_exp = export_df_to_pdf(export_df_exp, title=f"Expenses for {selected_month}")
+                export_key = (st.session_state.user_email, selected_month, data_version)
+                csv_bytes_exp = cached_export(export_key + ("expenses.csv",), lambda: export_df_to_csv(df_exp))
+                pdf_bytes_exp = cached_export(export_key + ("expenses.pdf",), lambda: export_df_to_pdf(df_exp, title=f"Expenses for {selected_month}"))
 
                 st.download_button(
                     "📄 Export Expenses as CSV",
@@ -95,11 +135,9 @@ def dashboard_page(exp_mgr, inc_mgr):
     with col2:
         if not df_inc.empty and len(df_inc) > 0:
             try:
-                # Remove User column if it exists and ensure data is clean
-                export_df_inc = df_inc.drop(columns=["User"], errors='ignore')
-                
-                csv_bytes_inc = export_df_to_csv(export_df_inc)
-                pdf_bytes_inc = export_df_to_pdf(export_df_inc, title=f"Incomes for {selected_month}")
+                export_key = (st.session_state.user_email, selected_month, data_version)
+                csv_bytes_inc = cached_export(export_key + ("income.csv",), lambda: export_df_to_csv(df_inc))
+                pdf_bytes_inc = cached_export(export_key + ("income.pdf",), lambda: export_df_to_pdf(df_inc, title=f"Incomes for {selected_month}"))
 
                 st.download_button(
                     "📄 Export Income as CSV",
@@ -119,8 +157,9 @@ def dashboard_page(exp_mgr, inc_mgr):
         else:
             st.info("No income data to export for this month.")
 
+@st.fragment
+def _data_management(exp_mgr, inc_mgr):
     # --- DATA MANAGEMENT SECTION ---
-    st.markdown("---")
     st.subheader("🗂️ Data Management")
     
     col1, col2, col3 = st.columns(3)
@@ -1,4 +1,5 @@
 import streamlit as st
+from auth import SESSION_PARAM
 
 def login_page(auth):
     st.title("💰 NeuroBux")
@@ -41,6 +42,10 @@ def login_page(auth):
                         st.session_state.logged_in = True
                         st.session_state.user_email = email.lower().strip()
                         st.session_state.page = "Dashboard"
+                        # Signed token so a refresh in this browser skips the login form
+                        token = auth.create_session_token(email)
+                        if token:
+                            st.query_params[SESSION_PARAM] = token
                         st.balloons()
                         
                         # Add welcome message
@@ -3,26 +3,28 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from database import SpendingAnalyzer
-from synbot import SmartBudgetAdvisor
+from resources import get_resource
+from frames import rupees
 
 def smart_analytics_page(exp_mgr, inc_mgr):
     st.header("Smart Budget Analytics")
     
-    # Initialize analyzer with Supabase client (updated from SQLite conn)
-    analyzer = SpendingAnalyzer(exp_mgr.supabase)  # ✅ Changed from exp_mgr.conn
-    advisor = SmartBudgetAdvisor(analyzer)
-    
-    # Get user data
-    user = st.session_state.user_email
-    patterns = analyzer.detect_spending_patterns(user)
-    insights = advisor.generate_budget_insights(None, patterns)
-    
     # Connection status check
     if not exp_mgr.supabase:
         st.error("❌ Database connection unavailable. Please check your Supabase configuration.")
         return
     
+    user = st.session_state.user_email
+    
+    # Fetch expenses once (cached per data version); patterns come from the shared analytics service
+    data_version = exp_mgr.data_version(user)
+    df_exp = exp_mgr.get_frame(user)
+    
+    service = get_resource("analytics")
+    advisor = get_resource("advisor")
+    patterns = service.get_patterns(user, df_exp, data_version)
+    insights = advisor.generate_budget_insights(None, patterns)
+    
     # Display insights cards
     st.subheader("💡 Personalized Insights")
     
@@ -42,15 +44,9 @@ def smart_analytics_page(exp_mgr, inc_mgr):
     # Spending Pattern Visualization
     st.subheader("📊 Spending Pattern Analysis")
     
-    # Get expense data directly from Supabase
     try:
-        expense_result = exp_mgr.supabase.table("expenses").select("*").eq("user_email", user).execute()
-        exp_data = expense_result.data
-        
-        if exp_data:
-            df = pd.DataFrame(exp_data)
-            df['date'] = pd.to_datetime(df['date'])
-            df['amount'] = df['amount'].astype(float)
+        if not df_exp.empty:
+            df = pd.DataFrame({'category': df_exp['category'], 'amount': rupees(df_exp['amount']), 'date': df_exp['date']})
             
             col1, col2 = st.columns(2)
             
@@ -78,7 +74,7 @@ def smart_analytics_page(exp_mgr, inc_mgr):
             
             with col2:
                 # Category spending pie chart
-                category_spending = df.groupby('category')['amount'].sum().sort_values(ascending=False)
+                category_spending = df.groupby('category', observed=True)['amount'].sum().sort_values(ascending=False)
                 
                 fig = px.pie(
                     values=category_spending.values,
@@ -113,9 +109,25 @@ def smart_analytics_page(exp_mgr, inc_mgr):
             else:
                 st.info("📅 Add expenses from multiple months to see spending trends")
             
+            # Daily spend with trailing averages, from the same trend engine as the insights
+            trends = service.get_trends(user, df_exp, data_version)
+            if trends is not None and len(trends.totals) >= 7:
+                fig = px.line(
+                    trends.frame().drop(columns="Daily"),
+                    title="📉 Daily Spending (7/30/90-day averages)"
+                )
+                fig.update_layout(
+                    template="plotly_dark",
+                    height=400,
+                    xaxis_title="Date",
+                    yaxis_title="Amount (₹/day)",
+                    legend_title_text=""
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            
             # Top spending categories
             st.subheader("🔝 Top Spending Categories")
-            top_categories = df.groupby('category')['amount'].sum().sort_values(ascending=False).head(10)
+            top_categories = df.groupby('category', observed=True)['amount'].sum().sort_values(ascending=False).head(10)
             
             col1, col2 = st.columns([2, 1])
             
@@ -171,27 +183,30 @@ def smart_analytics_page(exp_mgr, inc_mgr):
         
         st.info("💡 These expenses are significantly different from your usual spending in these categories. Review them to ensure accuracy.")
     
+    # Model-based outliers (IsolationForest, trained in the background)
+    outliers, fresh = service.get_model_outliers(user, df_exp, data_version)
+    if outliers:
+        st.subheader("🧠 Multivariate Outliers")
+        st.caption("Expenses that are unusual for their amount, category, weekday and day of month taken together."
+                   + ("" if fresh else " The model is refreshing in the background."))
+        st.dataframe(pd.DataFrame(outliers).drop(columns="id"), hide_index=True, use_container_width=True)
+    elif not fresh:
+        st.caption("🧠 Training the outlier model in the background; results will appear shortly.")
+    
     # Predictive Budget Forecast
     st.subheader("🔮 Monthly Budget Forecast")
     
     try:
-        # Get current month expenses from Supabase
-        current_month = datetime.now().strftime("%Y-%m")
-        current_day = datetime.now().day
-        days_in_month = 30  # Simplified
-        
-        current_month_result = exp_mgr.supabase.table("expenses").select("amount").eq("user_email", user).gte("date", f"{current_month}-01").lte("date", f"{current_month}-31").execute()
-        current_month_expenses = current_month_result.data
+        # Weekday-aware baseline plus recurring bills, over the full history already loaded
+        forecast = get_resource("forecast").forecast(user, df_exp, data_version)
+        current_day = forecast["day"]
+        days_in_month = forecast["days_in_month"]
+        remaining_days = forecast["remaining_days"]
         
-        if current_month_expenses:
-            current_spending = sum(expense['amount'] for expense in current_month_expenses)
-            
-            if current_day > 0:
-                predicted_monthly = (current_spending / current_day) * days_in_month
-                daily_average = current_spending / current_day
-            else:
-                predicted_monthly = 0
-                daily_average = 0
+        if forecast["spent"] > 0:
+            current_spending = forecast["spent"]
+            predicted_monthly = forecast["predicted"]
+            daily_average = forecast["daily_average"]
             
             col1, col2, col3 = st.columns(3)
             col1.metric("📊 Current Month Spend", f"₹{current_spending:,.2f}")
@@ -203,12 +218,15 @@ def smart_analytics_page(exp_mgr, inc_mgr):
             st.progress(progress)
             st.caption(f"Month Progress: {current_day}/{days_in_month} days ({(current_day/days_in_month)*100:.1f}%)")
             
+            if forecast["recurring_pending"]:
+                bills = ", ".join(f"{item['category'].title()} ₹{item['amount']:,.0f} (day {item['day']})"
+                                  for item in forecast["recurring_pending"])
+                st.caption(f"🔁 Recurring bills still due: {bills}")
+            
             # Budget recommendations
             if predicted_monthly > 0:
                 st.subheader("💡 Budget Recommendations")
                 
-                # Calculate recommended daily budget for rest of month
-                remaining_days = days_in_month - current_day
                 if remaining_days > 0:
                     recommended_daily = predicted_monthly / days_in_month
                     st.info(f"""
@@ -216,7 +234,7 @@ def smart_analytics_page(exp_mgr, inc_mgr):
                     - 📈 **Predicted monthly spending:** ₹{predicted_monthly:,.2f}
                     - 💰 **Recommended daily budget:** ₹{recommended_daily:,.2f}
                     - 📆 **Days remaining:** {remaining_days}
-                    - 🎯 **Suggested daily limit:** ₹{(predicted_monthly - current_spending) / max(remaining_days, 1):,.2f}
+                    - 🎯 **Suggested daily limit:** ₹{(predicted_monthly - current_spending) / remaining_days:,.2f}
                     """)
         else:
             st.info("📝 No expenses recorded for the current month yet.")
@@ -228,12 +246,10 @@ def smart_analytics_page(exp_mgr, inc_mgr):
     st.subheader("🎯 Savings Goal Tracker")
     
     try:
-        # Get income data from Supabase
-        income_result = inc_mgr.supabase.table("income").select("amount").eq("user_email", user).execute()
-        income_data = income_result.data
+        df_inc = inc_mgr.get_frame(user)
         
-        total_income = sum(income['amount'] for income in income_data) if income_data else 0
-        total_expenses = sum(expense['amount'] for expense in exp_data) if exp_data else 0
+        total_income = float(rupees(df_inc['amount'].sum()))
+        total_expenses = float(rupees(df_exp['amount'].sum()))
         
         if total_income > 0:
             savings_rate = ((total_income - total_expenses) / total_income) * 100
@@ -288,7 +304,7 @@ def smart_analytics_page(exp_mgr, inc_mgr):
     st.markdown("---")
     st.subheader("📋 Quick Statistics")
     
-    if exp_data:
+    if not df_exp.empty:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
@@ -310,13 +326,13 @@ def smart_analytics_page(exp_mgr, inc_mgr):
     # Export Analytics Data
     st.markdown("---")
     if st.button("📊 Export Analytics Report", type="primary"):
-        if exp_data:
+        if not df_exp.empty:
             analytics_report = {
                 "user_email": user,
                 "generated_at": datetime.now().isoformat(),
                 "spending_patterns": patterns,
-                "total_expenses": sum(expense['amount'] for expense in exp_data),
-                "total_income": sum(income['amount'] for income in income_data) if income_data else 0,
+                "total_expenses": float(rupees(df_exp['amount'].sum())),
+                "total_income": float(rupees(inc_mgr.get_frame(user)['amount'].sum())),
                 "insights": insights
             }
             
@@ -1,11 +1,26 @@
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, date
+from frames import rupees
+from resources import get_resource
+from search import PAGE_SIZE
 
 def view_expenses_page(exp_mgr, inc_mgr):
     st.header("View Expenses")
 
-    all_expenses = exp_mgr.get_expenses(st.session_state.user_email)
-    months = sorted({e[3][:7] for e in all_expenses if e[3]}, reverse=True)
+    # Each section is a fragment: its widgets rerun only that section.
+    # Writes bump the data version and sync the change feed, so a rerun
+    # section reads fresh rows without refetching the rest of the page.
+    # Row deletes rerun the month section, which refreshes the month list;
+    # search picks up the new data version on its next run.
+    _month_section(exp_mgr, inc_mgr)
+    st.markdown("---")
+    _search_section(exp_mgr)
+    st.markdown("---")
+    _data_management(exp_mgr, inc_mgr)
+
+@st.fragment
+def _month_section(exp_mgr, inc_mgr):
+    months = exp_mgr.get_months(st.session_state.user_email)
     if not months:
         months = [datetime.now().strftime("%Y-%m")]
 
@@ -20,8 +35,116 @@ def view_expenses_page(exp_mgr, inc_mgr):
     )
     st.session_state.selected_month = selected_month
 
-    # --- DATA MANAGEMENT BUTTONS ---
     st.markdown("---")
+    _expense_list(exp_mgr, selected_month)
+    st.markdown("---")
+    _income_list(inc_mgr, selected_month)
+
+# A delete can empty a month, so it reruns the whole month section (selector
+# included); the outcome is shown by the list
+def _delete_expense(exp_mgr, expense_id):
+    deleted = exp_mgr.delete_expense(st.session_state.user_email, expense_id)
+    st.session_state.expense_notice = (deleted, "Expense deleted!" if deleted else "Failed to delete expense")
+    st.rerun(scope="fragment")
+
+def _delete_income(inc_mgr, income_id):
+    deleted = inc_mgr.delete_income(st.session_state.user_email, income_id)
+    st.session_state.income_notice = (deleted, "Income deleted!" if deleted else "Failed to delete income")
+    st.rerun(scope="fragment")
+
+def _show_notice(key):
+    notice = st.session_state.pop(key, None)
+    if notice:
+        ok, message = notice
+        (st.success if ok else st.error)(message)
+
+def _expense_list(exp_mgr, selected_month):
+    # --- EXPENSES SECTION WITH SUPABASE ID-BASED DELETION ---
+    st.subheader("💸 Expenses")
+    _show_notice("expense_notice")
+    
+    try:
+        # Get expenses with full database information including IDs (exact month range)
+        df_exp = exp_mgr.get_frame(st.session_state.user_email, selected_month)
+        
+        if not df_exp.empty:
+            for row in df_exp.itertuples(index=False):
+                col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 1, 1])
+                col1.text(row.category)
+                col2.text(f"₹{rupees(row.amount):.2f}")
+                col3.text(f"{row.date:%Y-%m-%d}")
+                col4.empty()
+                
+                # Use the actual database ID for deletion
+                if col5.button("❌", key=f"del_exp_{row.id}"):
+                    _delete_expense(exp_mgr, int(row.id))
+        else:
+            st.info(f"No expenses logged for {selected_month}.")
+            
+    except Exception as e:
+        st.error(f"Error loading expenses: {str(e)}")
+
+def _income_list(inc_mgr, selected_month):
+    # --- INCOME SECTION WITH SUPABASE ID-BASED DELETION ---
+    st.subheader("💰 Income")
+    _show_notice("income_notice")
+    
+    try:
+        # Get income with full database information including IDs (exact month range)
+        df_inc = inc_mgr.get_frame(st.session_state.user_email, selected_month)
+        
+        if not df_inc.empty:
+            for row in df_inc.itertuples(index=False):
+                col1, col2, col3 = st.columns([3, 2, 1])
+                col1.text(f"₹{rupees(row.amount):.2f}")
+                col2.text(f"{row.date:%Y-%m-%d}")
+                
+                # Use the actual database ID for deletion
+                if col3.button("❌", key=f"del_inc_{row.id}"):
+                    _delete_income(inc_mgr, int(row.id))
+        else:
+            st.info(f"No income logged for {selected_month}.")
+            
+    except Exception as e:
+        st.error(f"Error loading income: {str(e)}")
+
+@st.fragment
+def _search_section(exp_mgr):
+    # --- SEARCH ACROSS ALL MONTHS ---
+    st.subheader("🔍 Search Expenses")
+
+    try:
+        user = st.session_state.user_email
+        index = get_resource("search").get(user, exp_mgr.data_version(user), lambda: exp_mgr.get_frame(user))
+        col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+        text = col1.text_input("Category or notes", key="search_text", placeholder="e.g. uber")
+        min_amount = col2.number_input("Min ₹", min_value=0.0, value=0.0, step=100.0, key="search_min")
+        max_amount = col3.number_input("Max ₹ (0 = any)", min_value=0.0, value=0.0, step=100.0, key="search_max")
+        year = col4.selectbox("Year", ["Any"] + index.years(), key="search_year")
+
+        if text.strip() or min_amount or max_amount or year != "Any":
+            rows = index.search(
+                text,
+                min_amount=min_amount or None,
+                max_amount=max_amount or None,
+                start=date(year, 1, 1) if year != "Any" else None,
+                end=date(year, 12, 31) if year != "Any" else None,
+            )
+            if len(rows):
+                pages = -(-len(rows) // PAGE_SIZE)
+                page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="search_page") if pages > 1 else 1
+                st.caption(f"{len(rows)} matches · page {page} of {pages}")
+                st.dataframe(index.page(rows, page - 1).drop(columns="id"), hide_index=True, use_container_width=True)
+            else:
+                st.info("No matching expenses.")
+    except Exception as e:
+        st.error(f"Error searching expenses: {str(e)}")
+
+@st.fragment
+def _data_management(exp_mgr, inc_mgr):
+    # --- DATA MANAGEMENT BUTTONS ---
+    # These change every section, so they rerun the whole page
+    selected_month = st.session_state.get("selected_month", datetime.now().strftime("%Y-%m"))
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
@@ -39,15 +162,8 @@ def view_expenses_page(exp_mgr, inc_mgr):
     with col2:
         if st.button("🗑️ Delete Selected Month", key="delete_selected_month"):
             if st.session_state.get('confirm_delete_month', False):
-                # Updated for Supabase - use date range deletion
-                start_date = f"{selected_month}-01"
-                end_date = f"{selected_month}-31"
-                
-                # Delete expenses for the month using Supabase
-                exp_mgr.supabase.table("expenses").delete().eq("user_email", st.session_state.user_email).gte("date", start_date).lte("date", end_date).execute()
-                
-                # Delete income for the month using Supabase
-                inc_mgr.supabase.table("income").delete().eq("user_email", st.session_state.user_email).gte("date", start_date).lte("date", end_date).execute()
+                exp_mgr.delete_month(st.session_state.user_email, selected_month)
+                inc_mgr.delete_month(st.session_state.user_email, selected_month)
                 
                 st.success(f"All data for {selected_month} deleted!")
                 st.session_state.confirm_delete_month = False
@@ -74,76 +190,3 @@ def view_expenses_page(exp_mgr, inc_mgr):
             st.session_state.confirm_delete_month = False
             st.session_state.confirm_delete_all_view = False
             st.info("Cancelled")
-
-    st.markdown("---")
-
-    # --- EXPENSES SECTION WITH SUPABASE ID-BASED DELETION ---
-    st.subheader("💸 Expenses")
-    
-    try:
-        # Get expenses with full database information including IDs from Supabase
-        if selected_month:
-            start_date = f"{selected_month}-01"
-            end_date = f"{selected_month}-31"
-            exp_result = exp_mgr.supabase.table("expenses").select("*").eq("user_email", st.session_state.user_email).gte("date", start_date).lte("date", end_date).order("date", desc=True).execute()
-        else:
-            exp_result = exp_mgr.supabase.table("expenses").select("*").eq("user_email", st.session_state.user_email).order("date", desc=True).execute()
-        
-        exp_full_data = exp_result.data
-        
-        if exp_full_data:
-            for row in exp_full_data:
-                col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 1, 1])
-                col1.text(row['category'])
-                col2.text(f"₹{row['amount']:.2f}")
-                col3.text(row['date'])
-                col4.empty()
-                
-                # Use the actual database ID for deletion
-                if col5.button("❌", key=f"del_exp_{row['id']}"):
-                    if exp_mgr.delete_expense(st.session_state.user_email, row['id']):
-                        st.success("Expense deleted!")
-                        st.rerun()
-                    else:
-                        st.error("Failed to delete expense")
-        else:
-            st.info(f"No expenses logged for {selected_month}.")
-            
-    except Exception as e:
-        st.error(f"Error loading expenses: {str(e)}")
-
-    st.markdown("---")
-    
-    # --- INCOME SECTION WITH SUPABASE ID-BASED DELETION ---
-    st.subheader("💰 Income")
-    
-    try:
-        # Get income with full database information including IDs from Supabase
-        if selected_month:
-            start_date = f"{selected_month}-01"
-            end_date = f"{selected_month}-31"
-            inc_result = inc_mgr.supabase.table("income").select("*").eq("user_email", st.session_state.user_email).gte("date", start_date).lte("date", end_date).order("date", desc=True).execute()
-        else:
-            inc_result = inc_mgr.supabase.table("income").select("*").eq("user_email", st.session_state.user_email).order("date", desc=True).execute()
-        
-        inc_full_data = inc_result.data
-        
-        if inc_full_data:
-            for row in inc_full_data:
-                col1, col2, col3 = st.columns([3, 2, 1])
-                col1.text(f"₹{row['amount']:.2f}")
-                col2.text(row['date'])
-                
-                # Use the actual database ID for deletion
-                if col3.button("❌", key=f"del_inc_{row['id']}"):
-                    if inc_mgr.delete_income(st.session_state.user_email, row['id']):
-                        st.success("Income deleted!")
-                        st.rerun()
-                    else:
-                        st.error("Failed to delete income")
-        else:
-            st.info(f"No income logged for {selected_month}.")
-            
-    except Exception as e:
-        st.error(f"Error loading income: {str(e)}")
-
@@ -0,0 +1,51 @@
+import hmac
+import hashlib
+import re
+import threading
+import streamlit as st
+from passlib.context import CryptContext
+
+DEFAULT_ROUNDS = 12
+HASH_WORKERS = 4
+# Hashes written before bcrypt: unsalted-per-user SHA-256 hex digests
+LEGACY_SALT = "neurobux_salt_2025"
+_LEGACY_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+def legacy_sha256(password):
+    return hashlib.sha256((password + LEGACY_SALT).encode()).hexdigest()
+
+class PasswordHasher:
+    """bcrypt hashing with a configurable cost and bounded concurrency.
+
+    Hashes run on the caller's session thread (bcrypt releases the GIL), but
+    at most ``workers`` at a time; a login burst queues for a slot instead
+    of saturating every core.
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=HASH_WORKERS):
+        self.rounds = rounds
+        self.context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def hash(self, password):
+        with self._slots:
+            return self.context.hash(password)
+
+    def verify(self, password, stored_hash):
+        """Returns (matches, needs_rehash)"""
+        if not stored_hash:
+            return False, False
+        if _LEGACY_HASH.match(stored_hash):
+            ok = hmac.compare_digest(legacy_sha256(password), stored_hash)
+            return ok, ok
+        try:
+            with self._slots:
+                ok = self.context.verify(password, stored_hash)
+        except ValueError:
+            return False, False
+        return ok, ok and self.context.needs_update(stored_hash)
+
+@st.cache_resource
+def get_password_hasher():
+    """Process-wide hasher; cost comes from the ``bcrypt_rounds`` secret"""
+    return PasswordHasher(rounds=int(st.secrets.get("bcrypt_rounds", DEFAULT_ROUNDS)))
@@ -0,0 +1,117 @@
+import time
+import threading
+from collections import Counter
+import streamlit as st
+from cache import TTLCache
+
+# Per email: a burst of 5 attempts, then one every 12 seconds
+EMAIL_CAPACITY = 5
+EMAIL_REFILL_PER_SEC = 1 / 12
+# Per client (IP or session): more headroom for shared networks
+CLIENT_CAPACITY = 20
+CLIENT_REFILL_PER_SEC = 1 / 3
+UNKNOWN_EMAIL_TTL = 60
+KNOWN_EMAIL_TTL = 10 * 60
+
+class TokenBucket:
+    def __init__(self, capacity, refill_per_sec, now):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def take(self, now, cost=1):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_sec)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+class RateLimiter:
+    """Token buckets keyed by an arbitrary string (email, client id, ...).
+
+    Idle buckets expire once they would have refilled, so memory stays
+    bounded by ``max_keys`` active keys.
+    """
+
+    def __init__(self, capacity, refill_per_sec, max_keys=10000, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.clock = clock
+        self._buckets = TTLCache(maxsize=max_keys, ttl=capacity / refill_per_sec, clock=clock)
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1):
+        with self._lock:
+            now = self.clock()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.capacity, self.refill_per_sec, now)
+            allowed = bucket.take(now, cost)
+            self._buckets.set(key, bucket)
+            return allowed
+
+    def reset(self, key):
+        self._buckets.pop(key)
+
+class AuthGuard:
+    """Sheds abusive login/registration load before it reaches Supabase.
+
+    - token buckets per email and per client
+    - a short-lived negative cache of emails with no account
+    - a cache of emails known to exist, so repeated sign-ups skip the lookup
+    - counters for every rejected or short-circuited attempt
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.by_email = RateLimiter(EMAIL_CAPACITY, EMAIL_REFILL_PER_SEC, clock=clock)
+        self.by_client = RateLimiter(CLIENT_CAPACITY, CLIENT_REFILL_PER_SEC, clock=clock)
+        self.unknown_emails = TTLCache(maxsize=10000, ttl=UNKNOWN_EMAIL_TTL, clock=clock)
+        self.known_emails = TTLCache(maxsize=10000, ttl=KNOWN_EMAIL_TTL, clock=clock)
+        self._metrics = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics)
+
+    def check(self, email, client):
+        """Returns None if the attempt may proceed, else a user-facing message"""
+        self.count("attempts")
+        # Without a trustworthy client id only the per-email limit applies; a shared bucket would lock everyone out
+        if client is not None and not self.by_client.allow(client):
+            self.count("rejected_client")
+            return "Too many attempts from this device. Please wait a minute and try again."
+        if not self.by_email.allow(email):
+            self.count("rejected_email")
+            return "Too many attempts for this account. Please wait a minute and try again."
+        return None
+
+    def is_unknown(self, email):
+        if self.unknown_emails.get(email):
+            self.count("negative_cache_hits")
+            return True
+        return False
+
+    def is_known(self, email):
+        if self.known_emails.get(email):
+            self.count("known_email_hits")
+            return True
+        return False
+
+    def mark_unknown(self, email):
+        self.unknown_emails.set(email, True)
+
+    def mark_known(self, email):
+        self.unknown_emails.pop(email)
+        self.known_emails.set(email, True)
+
+@st.cache_resource
+def get_auth_guard():
+    """Process-wide guard so limits apply across all sessions"""
+    return AuthGuard()
@@ -0,0 +1,161 @@
+import threading
+import streamlit as st
+
+class ResourceRegistry:
+    """Owns process-wide singletons (managers, analyzers, pools) and their lifecycle.
+
+    Resources are created lazily on first ``get`` and shared by every session
+    and rerun. Each may register a health check and a close hook; ``reset``
+    drops one so the next ``get`` rebuilds it.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, health_check=None, close=None):
+        with self._lock:
+            self._specs[name] = (factory, health_check, close)
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                factory = self._specs[name][0]
+                self._instances[name] = factory()
+            return self._instances[name]
+
+    def health(self):
+        """{name: (ok, message)} for resources that have been created"""
+        report = {}
+        for name, instance in list(self._instances.items()):
+            check = self._specs[name][1]
+            if check is None:
+                report[name] = (True, "ready")
+                continue
+            try:
+                report[name] = (True, check(instance) or "ok")
+            except Exception as e:
+                report[name] = (False, str(e)[:100])
+        return report
+
+    def reset(self, name):
+        with self._lock:
+            instance = self._instances.pop(name, None)
+        if instance is not None:
+            self._close(name, instance)
+
+    def close_all(self):
+        for name in list(self._instances):
+            self.reset(name)
+
+    def _close(self, name, instance):
+        close = self._specs[name][2]
+        if close is not None:
+            try:
+                close(instance)
+            except Exception:
+                pass
+
+def _check_supabase(client):
+    if client is None:
+        raise RuntimeError("Supabase client not initialized")
+    client.table("expenses").select("id").limit(1).execute()
+    return "reachable"
+
+def _check_jobs(queue):
+    return f"{queue.active_count()} active jobs"
+
+def _check_cache(service):
+    return f"{len(service.cache)} cached results"
+
+def _build_registry():
+    # Imports are deferred so pages only load what they use
+    from database import init_supabase, ExpenseManager, IncomeManager
+
+    registry = ResourceRegistry()
+    registry.register("supabase", init_supabase, health_check=_check_supabase)
+
+    def auth_manager():
+        from auth import AuthManager
+        return AuthManager(registry.get("supabase"))
+
+    def analytics():
+        from analytics import get_analytics_service
+        return get_analytics_service()
+
+    def advisor():
+        from synbot import SmartBudgetAdvisor
+        return SmartBudgetAdvisor(registry.get("analytics").analyzer)
+
+    def synbot():
+        from synbot import get_synbot
+        return get_synbot()
+
+    def forecast():
+        from forecast import get_forecast_engine
+        return get_forecast_engine()
+
+    def ledger():
+        from ledger import get_ledger_index
+        return get_ledger_index()
+
+    def search():
+        from search import get_search_index
+        return get_search_index()
+
+    def dedupe():
+        from dedupe import get_dedupe_index
+        return get_dedupe_index()
+
+    def categorizer():
+        from categorizer import get_auto_categorizer
+        return get_auto_categorizer()
+
+    def jobs():
+        from jobs import get_job_queue
+        return get_job_queue()
+
+    def changefeed():
+        from database import get_data_versions
+        from changefeed import ChangeFeed, PollingChangeSource
+        feed = ChangeFeed(get_data_versions(), PollingChangeSource(registry.get("supabase")))
+        registry.get("expenses").feed = feed
+        registry.get("income").feed = feed
+        feed.subscribe(registry.get("analytics").analyzer.anomalies.on_changes)
+        feed.subscribe(registry.get("analytics").analyzer.trends.on_changes)
+        feed.subscribe(registry.get("ledger").on_changes)
+        feed.subscribe(registry.get("search").on_changes)
+        return feed
+
+    def detach_feed(feed):
+        for name in ("expenses", "income"):
+            manager = registry.get(name)
+            if manager.feed is feed:
+                manager.feed = None
+
+    registry.register("auth", auth_manager)
+    registry.register("expenses", ExpenseManager)
+    registry.register("income", IncomeManager)
+    registry.register("analytics", analytics, health_check=_check_cache, close=lambda s: s.invalidate())
+    registry.register("advisor", advisor)
+    registry.register("synbot", synbot, health_check=lambda bot: f"model {bot.model}")
+    registry.register("forecast", forecast)
+    registry.register("categorizer", categorizer)
+    registry.register("dedupe", dedupe)
+    registry.register("ledger", ledger)
+    registry.register("search", search)
+    registry.register("jobs", jobs, health_check=_check_jobs)
+    registry.register("changefeed", changefeed, close=detach_feed)
+    return registry
+
+@st.cache_resource
+def get_registry():
+    """The process-wide registry; survives reruns and is shared by all sessions"""
+    return _build_registry()
+
+def get_resource(name):
+    return get_registry().get(name)
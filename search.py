@@ -0,0 +1,260 @@
+import bisect
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import streamlit as st
+from cache import TTLCache, make_key, owned_file, private_dir
+from categories import normalize_category
+from frames import rupees, to_paise
+
+INDEX_DIR = "search"  # under cache.DATA_DIR
+PAGE_SIZE = 25
+# Deleted rows stay as tombstones until they are this share of the index
+COMPACT_FRACTION = 0.25
+_TOKEN = re.compile(r"\w+")
+logger = logging.getLogger(__name__)
+
+def tokenize(text):
+    return _TOKEN.findall(normalize_category(text))
+
+class UserSearchIndex:
+    """One user's expenses as column arrays plus an inverted index.
+
+    Rows keep their position for life (deletes are tombstones). ``postings``
+    maps each category/description token to row positions; ``by_amount`` and
+    ``by_day`` are positions sorted by amount and date, so range filters are
+    binary searches.
+    """
+
+    def __init__(self, version, ids, categories, descriptions, amounts, days):
+        self.version = version
+        self.ids = ids
+        self.categories = categories
+        self.descriptions = descriptions
+        self.amounts = amounts
+        self.days = days
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.positions = dict(zip(ids.tolist(), range(len(ids))))
+        self.by_amount = np.argsort(amounts, kind="stable")
+        self.by_day = np.argsort(days, kind="stable")
+        postings = defaultdict(list)
+        texts = pd.Series(categories + " " + descriptions)
+        for text, rows in texts.groupby(texts).indices.items():
+            for token in set(tokenize(text)):
+                postings[token].extend(rows.tolist())
+        self.postings = {token: np.sort(np.asarray(rows, dtype=np.int64)) for token, rows in postings.items()}
+        self.vocabulary = sorted(self.postings)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, version, df_exp):
+        return cls(version, df_exp["id"].to_numpy(np.int64), df_exp["category"].astype(str).to_numpy(object),
+                   df_exp["description"].astype(str).to_numpy(object), df_exp["amount"].to_numpy(np.int64),
+                   df_exp["date"].values.astype("datetime64[D]"))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @property
+    def deleted(self):
+        return len(self.ids) - int(self.alive.sum())
+
+    def insert(self, row_id, category, description, amount, day):
+        if row_id in self.positions:
+            return
+        pos = len(self.ids)
+        self.ids = np.append(self.ids, row_id)
+        self.categories = np.append(self.categories, category)
+        self.descriptions = np.append(self.descriptions, description)
+        self.amounts = np.append(self.amounts, amount)
+        self.days = np.append(self.days, day)
+        self.alive = np.append(self.alive, True)
+        self.positions[row_id] = pos
+        self.by_amount = np.insert(self.by_amount, np.searchsorted(self.amounts[self.by_amount], amount, side="right"), pos)
+        self.by_day = np.insert(self.by_day, np.searchsorted(self.days[self.by_day], day, side="right"), pos)
+        for token in set(tokenize(f"{category} {description}")):
+            if token not in self.postings:
+                bisect.insort(self.vocabulary, token)
+                self.postings[token] = np.array([pos], dtype=np.int64)
+            else:
+                self.postings[token] = np.append(self.postings[token], pos)
+
+    def delete(self, row_id):
+        pos = self.positions.pop(row_id, None)
+        if pos is not None:
+            self.alive[pos] = False
+
+    def _matching(self, term):
+        """Posting lists of every token starting with ``term``"""
+        lo = bisect.bisect_left(self.vocabulary, term)
+        hi = bisect.bisect_left(self.vocabulary, term + "\uffff")
+        return [self.postings[token] for token in self.vocabulary[lo:hi]]
+
+    def _range(self, order, values, low, high):
+        lo = 0 if low is None else np.searchsorted(values[order], low, side="left")
+        hi = len(order) if high is None else np.searchsorted(values[order], high, side="right")
+        return order[lo:hi]
+
+    def search(self, text="", min_amount=None, max_amount=None, start=None, end=None):
+        """Positions of live rows matching every filter, newest first.
+
+        ``text`` terms are ANDed, each matching category/description tokens by
+        prefix; amounts are rupees and dates anything datetime64 accepts, all
+        bounds inclusive.
+        """
+        min_amount, max_amount = (None if v is None else int(to_paise([v])[0]) for v in (min_amount, max_amount))
+        start, end = (None if v is None else np.datetime64(v, "D") for v in (start, end))
+        with self.lock:
+            filters = [self._matching(term) for term in tokenize(text)]
+            if min_amount is not None or max_amount is not None:
+                filters.append([self._range(self.by_amount, self.amounts, min_amount, max_amount)])
+            if start is not None or end is not None:
+                filters.append([self._range(self.by_day, self.days, start, end)])
+            # Each filter scatters its positions into a bitmap; ANDing bitmaps beats sorted intersections
+            keep = self.alive.copy()
+            for positions in filters:
+                hit = np.zeros(len(keep), dtype=bool)
+                for part in positions:
+                    hit[part] = True
+                keep &= hit
+            rows = np.flatnonzero(keep)
+            return rows[np.lexsort((-self.ids[rows], -self.days[rows].astype(np.int64)))]
+
+    def page(self, rows, page, page_size=PAGE_SIZE):
+        """One page of ``rows`` as a display frame (id kept for actions)"""
+        rows = rows[page * page_size:(page + 1) * page_size]
+        return pd.DataFrame({
+            "id": self.ids[rows],
+            "Date": pd.to_datetime(self.days[rows]).strftime("%Y-%m-%d"),
+            "Category": self.categories[rows],
+            "Description": self.descriptions[rows],
+            "Amount": rupees(self.amounts[rows]),
+        })
+
+    def years(self):
+        with self.lock:
+            days = self.days[self.alive]
+        return sorted(set(days.astype("datetime64[Y]").astype(int) + 1970), reverse=True)
+
+class SearchIndex:
+    """Per-user transaction search index, persisted locally.
+
+    Built from the typed expense frame (or loaded from disk when the saved
+    copy matches the data version), then kept current from change-feed
+    events like AnomalyMonitor and LedgerIndex. A version the events did not
+    cover, or too many tombstones, triggers a rebuild. Saving happens on a
+    background thread, at most one pending save per user.
+    """
+
+    def __init__(self, label=None, index_dir=INDEX_DIR):
+        self.label = label or (lambda user, category_id, text: text)
+        self.index_dir = index_dir
+        self._indexes = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+        self._saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-save")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+
+    def get(self, user, data_version, load_frame):
+        """The user's UserSearchIndex at ``data_version``; ``load_frame()`` is only called to rebuild"""
+        index = self._indexes.get(user)
+        if index is not None and index.version == data_version:
+            return index
+        index = self._load(user)
+        if index is None or index.version != data_version:
+            index = UserSearchIndex.build(data_version, load_frame())
+            self._indexes.set(user, index)
+            self._schedule_save(user)
+            return index
+        self._indexes.set(user, index)
+        return index
+
+    def on_changes(self, user, events, version):
+        """ChangeFeed listener: add inserted expenses, tombstone deleted ones"""
+        index = self._indexes.get(user)
+        if index is None:
+            return
+        with index.lock:
+            for event in events:
+                if event.table != "expenses":
+                    continue
+                row = event.row
+                if event.op == "INSERT" and row.get("date"):
+                    index.insert(row["id"], self.label(user, row.get("category_id"), row.get("category")),
+                                 str(row.get("description") or "").strip(), int(to_paise([row.get("amount")])[0]),
+                                 np.datetime64(str(row["date"])[:10], "D"))
+                elif event.op == "DELETE":
+                    index.delete(row["id"])
+            index.version = version
+        if index.deleted > COMPACT_FRACTION * len(index.ids):
+            self._indexes.pop(user)  # Rebuilt (and saved) on the next search
+        else:
+            self._schedule_save(user)
+
+    def forget(self, user):
+        """Drop the user's index from memory and disk (their data was wiped)"""
+        with self._lock:
+            self._pending.discard(user)
+        with self._io_lock:
+            self._indexes.pop(user)
+            try:
+                os.remove(self._path(user))
+            except FileNotFoundError:
+                pass
+
+    def _path(self, user):
+        return os.path.join(private_dir(self.index_dir), make_key("search", user)[:32] + ".joblib")
+
+    def _load(self, user):
+        try:
+            import joblib
+            path = self._path(user)
+            return joblib.load(path) if owned_file(path) else None
+        except Exception:
+            return None
+
+    def _schedule_save(self, user):
+        with self._lock:
+            if user in self._pending:
+                return  # The queued save will pick up this change too
+            self._pending.add(user)
+        self._saver.submit(self._flush, user)
+
+    def _flush(self, user):
+        with self._lock:
+            if user not in self._pending:
+                return
+            self._pending.discard(user)
+        with self._io_lock:
+            index = self._indexes.get(user)
+            if index is not None:
+                self._save(user, index)
+
+    def _save(self, user, index):
+        import joblib
+
+        try:
+            path = self._path(user)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with index.lock:
+                joblib.dump(index, tmp)
+            os.replace(tmp, path)
+        except Exception:
+            # Persistence only saves a rebuild after restarts; the in-memory index still serves
+            logger.warning("Could not save the search index for %s", make_key("search", user)[:12], exc_info=True)
+
+@st.cache_resource
+def get_search_index():
+    from database import get_category_dictionary  # deferred: database pulls in Supabase
+    return SearchIndex(get_category_dictionary().label)
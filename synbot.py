@@ -1,7 +1,41 @@
-import re
 import yfinance as yf
 import streamlit as st
 from cohere import ClientV2  # Ensure cohere is installed: pip install cohere
+from cache import TTLCache, make_key
+from financial_context import FinancialContextBuilder
+from intents import IntentRouter
+
+SYSTEM_PROMPT = (
+    "You are SynBot, a knowledgeable financial AI assistant for NeuroBux. "
+    "Analyze spending patterns, give budgeting & saving tips, investment basics, "
+    "and motivational advice. Be friendly, concise, and occasionally use emojis."
+)
+
+SUMMARY_PROMPT = (
+    "Update the running memo of a conversation between a user and SynBot, a financial "
+    "assistant. Keep facts, goals, numbers and decisions the user mentioned; drop "
+    "pleasantries. Reply with the memo only, under 120 words."
+)
+
+# Cached answers live for 30 minutes; the financial context is part of the key,
+# so new transactions naturally produce a fresh answer.
+RESPONSE_CACHE_TTL = 30 * 60
+RESPONSE_CACHE_SIZE = 512
+
+@st.cache_resource
+def get_cohere_client(api_key):
+    """Process-wide Cohere client so the HTTP connection pool is reused"""
+    return ClientV2(api_key=api_key)
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide cache of SynBot answers"""
+    return TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+@st.cache_resource
+def get_synbot():
+    """Shared SynBot, created the first time NeuroBot is opened"""
+    return SynBot()
 
 class SynBot:
     def __init__(self, model="command-a-03-2025"):
@@ -13,44 +47,10 @@ class SynBot:
         self.api_key = st.secrets.get("cohere_api_key")
         if not self.api_key:
             raise ValueError("🤖 API Key missing! Please add 'cohere_api_key' to Streamlit secrets.")
-
-    def _format_financial_summary(self, df_exp, df_inc, analytics_data):
-        parts = []
-
-        if df_exp is not None and not df_exp.empty:
-            spent = df_exp["Amount"].sum()
-            parts.append(f"Total spent ₹{spent:.2f} across {len(df_exp)} transactions.")
-            try:
-                top_cat = df_exp.groupby("Category")["Amount"].sum().idxmax()
-                avg_exp = df_exp["Amount"].mean()
-                category_split = df_exp.groupby("Category")["Amount"].sum().to_dict()
-                parts += [
-                    f"Top category: {top_cat}",
-                    f"Average expense: ₹{avg_exp:.2f}",
-                    f"Category breakdown: {category_split}"
-                ]
-            except Exception:
-                pass
-
-        if df_inc is not None and not df_inc.empty:
-            earned = df_inc["Amount"].sum()
-            avg_inc = df_inc["Amount"].mean()
-            parts += [
-                f"Total income: ₹{earned:.2f} from {len(df_inc)} sources.",
-                f"Average income: ₹{avg_inc:.2f}"
-            ]
-            if df_exp is not None and not df_exp.empty:
-                parts.append(f"Net balance: ₹{earned - df_exp['Amount'].sum():.2f}")
-
-        if analytics_data:
-            trend = analytics_data.get("trend", 1)
-            trend_status = "increasing" if trend > 1.1 else "stable" if trend > 0.9 else "decreasing"
-            parts.append(
-                f"Spending patterns: peak on {analytics_data.get('peak_day', 'weekdays')}, "
-                f"trend: {trend_status}, top category: {analytics_data.get('top_category', 'miscellaneous')}."
-            )
-
-        return " ".join(parts)
+        self.client = get_cohere_client(self.api_key)
+        self.response_cache = get_response_cache()
+        self.context_builder = FinancialContextBuilder()
+        self.router = IntentRouter(price_lookup=self._live_price)
 
     def _live_price(self, symbol):
         try:
@@ -64,42 +64,69 @@ class SynBot:
         except Exception as e:
             return f"⚠ *{symbol}*: {e}"
 
-    def answer(self, question, df_exp=None, df_inc=None, analytics_data=None):
+    def answer(self, question, df_exp=None, df_inc=None, analytics_data=None, user=None, *, data_version,
+               history=None, memo=None, on_delta=None, cancel_event=None):
         q_clean = question.strip()
-        symbol_match = re.search(r"\b([A-Z]{2,5})\b", q_clean.upper())
-        if "price" in q_clean.lower() and symbol_match:
-            return self._live_price(symbol_match.group(1))
-
-        context = self._format_financial_summary(df_exp, df_inc, analytics_data)
-
+        # Lookups ("total this month", "price of AAPL") are answered locally
+        local = self.router.route(q_clean, df_exp, df_inc)
+        if local is not None:
+            return local
+
+        context = self.context_builder.get(user, data_version, df_exp, df_inc, analytics_data)
+
+        history = [{"role": m["role"], "content": m["content"]} for m in (history or [])]
+        cache_key = make_key(self.model, SYSTEM_PROMPT, q_clean, make_key(context), memo, history)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if memo:
+            messages.append({"role": "system", "content": f"Earlier in this conversation: {memo}"})
+        messages += history
+        messages.append({
+            "role": "user",
+            "content": f"Question: {q_clean}\n\nUser's Financial Context: {context}"
+        })
+        answer, ok = self._call_cohere_stream(messages, on_delta, cancel_event)
+        if ok and answer:
+            # Only successful generations are cached so errors are retried
+            self.response_cache.set(cache_key, answer)
+        return answer
+
+    def summarize(self, memo, turns):
+        """Fold ``turns`` into the running conversation memo; returns (text, succeeded)"""
+        transcript = "\n".join(
+            f"{'User' if m['role'] == 'user' else 'SynBot'}: {m['content']}" for m in turns
+        )
         messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are SynBot, a knowledgeable financial AI assistant for NeuroBux. "
-                    "Analyze spending patterns, give budgeting & saving tips, investment basics, "
-                    "and motivational advice. Be friendly, concise, and occasionally use emojis."
-                )
-            },
-            {
-                "role": "user",
-                "content": f"Question: {q_clean}\n\nUser's Financial Context: {context}"
-            }
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Current memo: {memo or '(empty)'}\n\nNew messages:\n{transcript}"}
         ]
         return self._call_cohere_stream(messages)
 
-    def _call_cohere_stream(self, messages):
+    def _call_cohere_stream(self, messages, on_delta=None, cancel_event=None):
+        """Stream a chat completion; returns (text, succeeded).
+
+        ``on_delta`` receives each text chunk as it arrives; setting
+        ``cancel_event`` stops reading the stream (the partial text is returned
+        and not treated as a success).
+        """
         try:
-            client = ClientV2(api_key=self.api_key)
             cohere_messages = [{"role": m["role"], "content": m["content"]} for m in messages]
-            stream = client.chat_stream(model=self.model, messages=cohere_messages, temperature=0.3)
+            stream = self.client.chat_stream(model=self.model, messages=cohere_messages, temperature=0.3)
             output = []
             for event in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    return "".join(output).strip(), False
                 if event.type == "content-delta":
-                    output.append(event.delta.message.content.text)
-            return "".join(output).strip()
+                    text = event.delta.message.content.text
+                    output.append(text)
+                    if on_delta:
+                        on_delta(text)
+            return "".join(output).strip(), True
         except Exception as e:
-            return f"🤖 Cohere Error: {str(e)[:100]}"
+            return f"🤖 Cohere Error: {str(e)[:100]}", False
 
 class SmartBudgetAdvisor:
     def __init__(self, analyzer=None):
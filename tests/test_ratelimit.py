@@ -0,0 +1,74 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit import AuthGuard, RateLimiter, EMAIL_CAPACITY, EMAIL_REFILL_PER_SEC, UNKNOWN_EMAIL_TTL
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def test_bucket_refills_over_time():
+    clock = FakeClock()
+    limiter = RateLimiter(capacity=2, refill_per_sec=1, clock=clock)
+    assert limiter.allow("k") and limiter.allow("k")
+    assert not limiter.allow("k")
+    clock.advance(1)
+    assert limiter.allow("k")
+    assert not limiter.allow("k")
+
+
+def test_keys_are_independent():
+    clock = FakeClock()
+    limiter = RateLimiter(capacity=1, refill_per_sec=0.1, clock=clock)
+    assert limiter.allow("a")
+    assert not limiter.allow("a")
+    assert limiter.allow("b")
+
+
+def test_email_limit_and_metrics():
+    clock = FakeClock()
+    guard = AuthGuard(clock=clock)
+    for _ in range(EMAIL_CAPACITY):
+        assert guard.check("a@b.com", "1.2.3.4") is None
+    assert "this account" in guard.check("a@b.com", "1.2.3.4")
+    clock.advance(1 / EMAIL_REFILL_PER_SEC)
+    assert guard.check("a@b.com", "1.2.3.4") is None
+    assert guard.metrics() == {"attempts": EMAIL_CAPACITY + 2, "rejected_email": 1}
+
+
+def test_client_limit_spans_emails():
+    guard = AuthGuard(clock=FakeClock())
+    results = [guard.check(f"user{i}@b.com", "1.2.3.4") for i in range(guard.by_client.capacity + 1)]
+    assert all(r is None for r in results[:-1])
+    assert "this device" in results[-1]
+    assert guard.check("other@b.com", "5.6.7.8") is None
+
+
+def test_missing_client_id_only_limits_by_email():
+    guard = AuthGuard(clock=FakeClock())
+    for i in range(guard.by_client.capacity * 2):
+        assert guard.check(f"user{i}@b.com", None) is None
+    assert "rejected_client" not in guard.metrics()
+
+
+def test_unknown_email_cache_expires():
+    clock = FakeClock()
+    guard = AuthGuard(clock=clock)
+    guard.mark_unknown("nobody@b.com")
+    assert guard.is_unknown("nobody@b.com")
+    clock.advance(UNKNOWN_EMAIL_TTL)
+    assert not guard.is_unknown("nobody@b.com")
+    guard.mark_unknown("nobody@b.com")
+    guard.mark_known("nobody@b.com")
+    assert not guard.is_unknown("nobody@b.com")
+    assert guard.is_known("nobody@b.com")
@@ -0,0 +1,195 @@
+import threading
+from collections import defaultdict
+from datetime import date
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from cache import TTLCache
+from frames import rupees, to_paise
+
+TREND_WINDOWS = (7, 30, 90)
+# The headline trend compares the last 30 days with the 30 before them
+TREND_COMPARE_DAYS = 30
+
+def daily_totals(df_exp, through):
+    """Dense daily rupee totals from the first expense through ``through`` (datetime64[D]).
+
+    Returns (start, totals); start is None when there is nothing on or before ``through``.
+    """
+    if df_exp is None or df_exp.empty:
+        return None, np.zeros(0)
+    days = df_exp["date"].values.astype("datetime64[D]")
+    keep = days <= through
+    if not keep.any():
+        return None, np.zeros(0)
+    start = days[keep].min()
+    idx = (days[keep] - start).astype(np.int64)
+    totals = np.bincount(idx, weights=rupees(df_exp["amount"].values[keep]),
+                         minlength=int((through - start).astype(np.int64)) + 1)
+    return start, totals
+
+def ewm(values, span, level=None):
+    """EWM (``adjust=False``) of ``values``, continuing from ``level`` when given"""
+    alpha = 2 / (span + 1)
+    if level is None:
+        if len(values) == 0:
+            return np.zeros(0)
+        # Seeded with the first value, like pandas
+        rest = lfilter([alpha], [1, alpha - 1], values[1:], zi=[(1 - alpha) * values[0]])[0]
+        return np.concatenate(([values[0]], rest))
+    return lfilter([alpha], [1, alpha - 1], values, zi=[(1 - alpha) * level])[0]
+
+class DailyTrends:
+    """Daily spend series with prefix sums and EWM levels for each trend window"""
+
+    def __init__(self, start, totals, cumsum, levels):
+        self.start = start
+        self.totals = totals
+        self.cumsum = cumsum
+        self.levels = levels
+
+    @classmethod
+    def build(cls, start, totals, windows=TREND_WINDOWS):
+        cumsum = np.concatenate(([0.0], np.cumsum(totals)))
+        return cls(start, totals, cumsum, {w: ewm(totals, w) for w in windows})
+
+    @property
+    def end(self):
+        """Last day covered (datetime64[D])"""
+        return self.start + np.timedelta64(len(self.totals) - 1, "D")
+
+    def refold(self, totals, first):
+        """A new DailyTrends for ``totals``, which match this one's before day index ``first``.
+
+        Prefix sums and EWM levels are kept up to ``first`` and only continued from there.
+        """
+        changed = totals[first:]
+        cumsum = np.concatenate((self.cumsum[:first + 1], self.cumsum[first] + np.cumsum(changed)))
+        levels = {w: np.concatenate((series[:first], ewm(changed, w, series[first - 1] if first else None)))
+                  for w, series in self.levels.items()}
+        return DailyTrends(self.start, totals, cumsum, levels)
+
+    def window_sum(self, window, offset=0):
+        """Spend over the ``window`` days ending ``offset`` days before the last day"""
+        end = max(len(self.totals) - offset, 0)
+        return float(self.cumsum[end] - self.cumsum[max(end - window, 0)])
+
+    def rolling_mean(self, window):
+        """Trailing ``window``-day mean for every day (shorter windows at the start)"""
+        ends = np.arange(1, len(self.totals) + 1)
+        starts = np.maximum(ends - window, 0)
+        return (self.cumsum[ends] - self.cumsum[starts]) / (ends - starts)
+
+    def ratio(self, window=TREND_COMPARE_DAYS):
+        """Recent spend relative to the equally long period before it (1 = flat)"""
+        window = min(window, len(self.totals) // 2)
+        if window < 1:
+            return 1
+        previous = self.window_sum(window, offset=window)
+        return self.window_sum(window) / previous if previous > 0 else 1
+
+    def latest(self):
+        """Current trailing mean and EWM level per window, in rupees per day"""
+        summary = {}
+        for w, series in self.levels.items():
+            summary[f"{w}d_avg"] = self.window_sum(w) / min(w, len(self.totals))
+            summary[f"{w}d_ewm"] = float(series[-1])
+        return summary
+
+    def frame(self):
+        """Daily spend with 7/30/90-day trailing averages, indexed by date (for charts)"""
+        index = pd.to_datetime(self.start + np.arange(len(self.totals)))
+        columns = {"Daily": self.totals}
+        columns.update({f"{w}-day avg": self.rolling_mean(w) for w in self.levels})
+        return pd.DataFrame(columns, index=index)
+
+class TrendState:
+    """A user's DailyTrends at ``version`` plus the day deltas not folded into it yet"""
+
+    def __init__(self, version, trends, rows):
+        self.version = version
+        self.trends = trends
+        self.rows = rows  # id -> (day, rupees), to undo deletes
+        self.pending = defaultdict(float)  # day -> rupees, including today's rows
+        self.lock = threading.Lock()
+
+class TrendEngine:
+    """Time-based spending trends over completed days, kept per user.
+
+    Built once per user and data version from the expense frame, then kept
+    current from change-feed events (like AnomalyMonitor): events only record
+    per-day deltas, and ``update`` folds them in from the earliest changed day,
+    along with the days completed since. A version the events did not cover,
+    or a change before the first day, triggers a rebuild.
+    """
+
+    def __init__(self, windows=TREND_WINDOWS):
+        self.windows = windows
+        self._states = TTLCache(maxsize=1024, ttl=24 * 60 * 60)
+
+    def update(self, user, df_exp, data_version=None, today=None):
+        """DailyTrends for ``df_exp`` through yesterday, or None without expenses"""
+        through = np.datetime64(today or date.today(), "D") - np.timedelta64(1, "D")
+        if user is None or data_version is None:
+            start, totals = daily_totals(df_exp, through)
+            return DailyTrends.build(start, totals, self.windows) if start is not None else None
+        state = self._states.get(user)
+        if state is not None and state.version == data_version:
+            with state.lock:
+                if self._fold(state, through):
+                    return state.trends
+        state = self._build(df_exp, data_version, through)
+        self._states.set(user, state)
+        return state.trends
+
+    def on_changes(self, user, events, version):
+        """ChangeFeed listener: record the day deltas of inserted and deleted expenses"""
+        state = self._states.get(user)
+        if state is None:
+            return
+        with state.lock:
+            for event in events:
+                if event.table != "expenses":
+                    continue
+                row = event.row
+                if event.op == "INSERT":
+                    if row["id"] in state.rows or not row.get("date"):
+                        continue
+                    day = np.datetime64(str(row["date"])[:10], "D")
+                    amount = float(rupees(to_paise([row.get("amount")])[0]))
+                    state.rows[row["id"]] = (day, amount)
+                    state.pending[day] += amount
+                elif event.op == "DELETE":
+                    entry = state.rows.pop(row["id"], None)
+                    if entry is not None:
+                        state.pending[entry[0]] -= entry[1]
+            state.version = version
+
+    def _build(self, df_exp, data_version, through):
+        start, totals = daily_totals(df_exp, through)
+        trends = DailyTrends.build(start, totals, self.windows) if start is not None else None
+        if df_exp is None or df_exp.empty:
+            return TrendState(data_version, trends, {})
+        days = df_exp["date"].values.astype("datetime64[D]")
+        amounts = rupees(df_exp["amount"].to_numpy())
+        state = TrendState(data_version, trends, dict(zip(df_exp["id"].tolist(), zip(days, amounts.tolist()))))
+        later = days > through
+        for day, amount in zip(days[later], amounts[later]):
+            state.pending[day] += amount
+        return state
+
+    def _fold(self, state, through):
+        """Fold pending deltas through ``through`` into the state; False if a rebuild is needed"""
+        due = sorted(day for day in state.pending if day <= through)
+        trends = state.trends
+        if trends is None or (due and due[0] < trends.start):
+            return trends is None and not due
+        grow = max(int((through - trends.end).astype(np.int64)), 0)
+        if not due and not grow:
+            return True
+        totals = np.concatenate((trends.totals, np.zeros(grow)))
+        for day in due:
+            totals[int((day - trends.start).astype(np.int64))] += state.pending.pop(day)
+        first = int((due[0] - trends.start).astype(np.int64)) if due else len(trends.totals)
+        state.trends = trends.refold(totals, first)
+        return True
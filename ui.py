@@ -1,9 +1,8 @@
 import streamlit as st
-from auth import AuthManager
-from database import ExpenseManager, IncomeManager, init_supabase
-from synbot import SynBot
+import importlib
+from auth import SESSION_PARAM
+from resources import get_registry, get_resource
 from pages.login import login_page
-from pages import dashboard, add_transaction, view_expenses, ai_coach, smart_analytics
 from datetime import datetime
 
 # Page configuration
@@ -26,7 +25,7 @@ st.markdown("""
 for key, default in {
     "logged_in": False, 
     "user_email": "", 
-    "page": " Dashboard", 
+    "page": "Dashboard", 
     "selected_month": None,
     "confirm_reset_month": False,
     "confirm_delete_all": False,
@@ -38,28 +37,37 @@ for key, default in {
         st.session_state[key] = default
 
 # Initialize Supabase and managers
-supabase = init_supabase()
+supabase = get_resource("supabase")
 
 if not supabase:
     st.error("❌ Database connection failed. Please check your Supabase configuration.")
     st.info("Contact support if this issue persists.")
     st.stop()
 
-# Initialize managers with Supabase
-auth = AuthManager(supabase)  # ✅ Updated: Pass supabase client to auth manager
-exp_mgr = ExpenseManager()
-inc_mgr = IncomeManager()
-synbot = SynBot()
+# Shared managers from the resource registry (built once per process, not per rerun)
+auth = get_resource("auth")
+exp_mgr = get_resource("expenses")
+inc_mgr = get_resource("income")
 
-# Page navigation
+def get_synbot():
+    """SynBot (and the Cohere/yfinance imports behind it) is only loaded for NeuroBot"""
+    return get_resource("synbot")
+
+# Page navigation: (module, function, extra dependencies). Page modules pull in
+# plotly, pandas, fpdf, scikit-learn and Cohere, so each is imported on first visit.
 pages = {
-    "Dashboard": lambda: dashboard.dashboard_page(exp_mgr, inc_mgr),
-    "Add Transaction": lambda: add_transaction.add_transaction_page(exp_mgr, inc_mgr),
-    "View Expenses": lambda: view_expenses.view_expenses_page(exp_mgr, inc_mgr),
-    "Smart Analytics": lambda: smart_analytics.smart_analytics_page(exp_mgr, inc_mgr),
-    "NeuroBot": lambda: ai_coach.ai_coach_page(exp_mgr, inc_mgr, synbot),
+    "Dashboard": ("pages.dashboard", "dashboard_page", ()),
+    "Add Transaction": ("pages.add_transaction", "add_transaction_page", ()),
+    "View Expenses": ("pages.view_expenses", "view_expenses_page", ()),
+    "Smart Analytics": ("pages.smart_analytics", "smart_analytics_page", ()),
+    "NeuroBot": ("pages.ai_coach", "ai_coach_page", (get_synbot,)),
 }
 
+def render_page(label):
+    module_name, func_name, extras = pages[label]
+    page = getattr(importlib.import_module(module_name), func_name)
+    page(exp_mgr, inc_mgr, *(factory() for factory in extras))
+
 def test_database_connection():
     """Test database connection"""
     try:
@@ -72,6 +80,9 @@ def test_database_connection():
         return False, f"❌ Database connection failed: {str(e)}"
 
 def main_app():
+    # Bring this user's cached rows up to date (a no-op unless their data changed)
+    get_resource("changefeed").sync(st.session_state.user_email)
+
     # Custom CSS for better UI
     st.markdown("""
         <style>
@@ -120,7 +131,7 @@ def main_app():
 
     # Navigation buttons
     st.sidebar.markdown("### 📊 Navigation")
-    for label, func in pages.items():
+    for label in pages:
         selected = label == st.session_state.page
         if st.sidebar.button(label, key=label, use_container_width=True):
             st.session_state.page = label
@@ -136,6 +147,8 @@ def main_app():
             st.sidebar.success(message)
         else:
             st.sidebar.error(message)
+        for name, (ok, detail) in get_registry().health().items():
+            st.sidebar.caption(f"{'✅' if ok else '❌'} {name}: {detail}")
     
     # User info button
     if st.sidebar.button("👤 Account Info"):
@@ -151,9 +164,11 @@ def main_app():
     # Logout button
     st.sidebar.markdown("---")
     if st.sidebar.button("🚪 Logout", type="primary", use_container_width=True):
-        # Clear all session state
+        # Revoke remembered session tokens, then clear all session state
+        auth.revoke_sessions(st.session_state.user_email)
         for key in list(st.session_state.keys()):
             del st.session_state[key]
+        st.query_params.clear()
         
         # Reset to logged out state
         st.session_state.logged_in = False
@@ -165,11 +180,18 @@ def main_app():
 
     # Render the selected page
     try:
-        pages[st.session_state.page]()
+        render_page(st.session_state.page)
     except Exception as e:
         st.error(f"Error loading page: {str(e)}")
         st.info("Please try refreshing the page or contact support.")
 
+# Fast path: a returning browser session with a valid signed token skips login
+if not st.session_state.logged_in:
+    remembered = auth.verify_session_token(st.query_params.get(SESSION_PARAM))
+    if remembered:
+        st.session_state.logged_in = True
+        st.session_state.user_email = remembered
+
 # Main application logic
 if st.session_state.logged_in:
     main_app()
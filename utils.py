@@ -1,11 +1,31 @@
 import pandas as pd
+import streamlit as st
 from fpdf import FPDF
 import io
+from cache import TTLCache, make_key
+from frames import display_frame
+
+@st.cache_resource
+def get_export_cache():
+    return TTLCache(maxsize=256, ttl=60 * 60)
+
+def cached_export(key_parts, build):
+    """Return cached export bytes for ``key_parts`` (include the data version), building once"""
+    cache = get_export_cache()
+    key = make_key(*key_parts)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data)
+    return data
 
 def export_df_to_csv(df):
-    return df.to_csv(index=False).encode('utf-8')
+    """CSV bytes for a typed transaction frame (see frames.py)"""
+    return display_frame(df).to_csv(index=False).encode('utf-8')
 
 def export_df_to_pdf(df, title="Expense Report"):
+    """PDF table for a typed transaction frame (see frames.py)"""
+    df = display_frame(df)
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", size=14)